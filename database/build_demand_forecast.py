@@ -0,0 +1,263 @@
+"""
+Demand Forecast Builder for Game Store Database
+Computes dynamic reorder points for every INVENTORY row (product x branch).
+
+Daily demand series are built from ORDER_DETAIL over the last
+HISTORY_DAYS. The branch of an order line comes from its SALE row
+(in-store sales) or from the INVENTORY_MOVEMENT that shipped it (online
+orders); lines with no known branch are spread evenly over the branches
+stocking the product.
+
+Two models are fitted to all series at once with NumPy:
+    moving average         mean of the last MOVING_AVERAGE_DAYS
+    exponential smoothing  level updated with SMOOTHING_ALPHA every day
+Each series keeps the model with the lower one-step-ahead error, and its
+error spread sizes the safety stock:
+
+    reorder_point = demand * LEAD_TIME_DAYS + z * sigma * sqrt(LEAD_TIME_DAYS)
+    order_up_to   = reorder_point + demand * REVIEW_PERIOD_DAYS
+
+Results go to INVENTORY_FORECAST. Rows without any sales in the window
+get no forecast and keep using the static stock_alert_level.
+
+app.py runs this daily as the demand_forecast job; it can also be run on
+its own:
+    python database/build_demand_forecast.py
+"""
+
+import mysql.connector
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+DB_HOST = os.getenv("DB_HOST")
+DB_USER = os.getenv("DB_USER")
+DB_PASS = os.getenv("DB_PASS")
+DB_NAME = os.getenv("DB_NAME")
+DB_PORT = os.getenv("DB_PORT")
+
+# Configuration
+HISTORY_DAYS = 91  # Days of demand history per series (today excluded)
+MOVING_AVERAGE_DAYS = 28  # Moving average window, also the warm-up period
+SMOOTHING_ALPHA = 0.3  # Exponential smoothing weight of the newest day
+LEAD_TIME_DAYS = 7  # Days between placing and receiving a purchase order
+REVIEW_PERIOD_DAYS = 14  # Demand one order should cover after it arrives
+SERVICE_LEVEL_Z = 1.65  # Safety stock factor (~95% of lead times covered)
+BATCH_SIZE = 1000  # Rows per multi-row INSERT
+
+MODELS = ["moving_average", "exponential_smoothing"]
+
+
+def load_inventory(cursor):
+    """(inventory_ids, product_ids, branch_ids, maximum_stock) arrays"""
+    cursor.execute(
+        """
+        SELECT inventory_id, product_id, branch_id, COALESCE(maximum_stock, 0)
+        FROM INVENTORY
+        ORDER BY product_id, branch_id
+    """
+    )
+    rows = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 4)
+    return rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3]
+
+
+def fetch_daily_demand(cursor):
+    """
+    (product_id, branch_id or None, days_ago, quantity) per product, branch
+    and day of non-cancelled orders in the window
+    """
+    cursor.execute(
+        """
+        SELECT od.product_id,
+               COALESCE(
+                   (SELECT MAX(s.branch_id) FROM SALE s
+                    WHERE s.order_id = o.order_id),
+                   (SELECT MAX(i.branch_id)
+                    FROM INVENTORY_MOVEMENT m
+                    JOIN INVENTORY i ON m.inventory_id = i.inventory_id
+                    WHERE m.movement_type IN ('sale', 'offline_sale')
+                      AND m.reference_id = o.order_id
+                      AND i.product_id = od.product_id)
+               ) as branch_id,
+               DATEDIFF(CURDATE(), DATE(o.order_date)) as days_ago,
+               SUM(od.quantity)
+        FROM ORDER_DETAIL od
+        JOIN `ORDER` o ON od.order_id = o.order_id
+        WHERE o.order_status != 'cancelled'
+          AND od.product_id IS NOT NULL
+          AND o.order_date >= CURDATE() - INTERVAL %s DAY
+          AND o.order_date < CURDATE()
+        GROUP BY od.product_id, branch_id, days_ago
+    """,
+        (HISTORY_DAYS,),
+    )
+    return cursor.fetchall()
+
+
+def build_demand_matrix(product_ids, branch_ids, lines):
+    """
+    Daily demand per INVENTORY row, oldest day first, as a
+    (rows x HISTORY_DAYS) matrix. product_ids/branch_ids must be sorted by
+    (product_id, branch_id).
+    """
+    demand = np.zeros((len(product_ids), HISTORY_DAYS))
+    if not lines or len(product_ids) == 0:
+        return demand
+
+    products = np.array([line[0] for line in lines], dtype=np.int64)
+    branches = np.array(
+        [-1 if line[1] is None else line[1] for line in lines], dtype=np.int64
+    )
+    days = HISTORY_DAYS - np.array([line[2] for line in lines], dtype=np.int64)
+    quantities = np.array([line[3] for line in lines], dtype=np.float64)
+    in_window = (days >= 0) & (days < HISTORY_DAYS)
+
+    # Lines with a known branch: add to that INVENTORY row, if it exists
+    base = int(max(branch_ids.max(), branches.max())) + 1
+    row_keys = product_ids * base + branch_ids
+    keys = products * base + branches
+    rows = np.searchsorted(row_keys, keys).clip(max=len(row_keys) - 1)
+    known = in_window & (branches >= 0) & (row_keys[rows] == keys)
+    np.add.at(demand, (rows[known], days[known]), quantities[known])
+
+    # Lines without a branch: split evenly over the product's rows
+    catalog, row_product = np.unique(product_ids, return_inverse=True)
+    product_index = np.searchsorted(catalog, products).clip(max=len(catalog) - 1)
+    unknown = in_window & (branches < 0) & (catalog[product_index] == products)
+    if unknown.any():
+        per_product = np.zeros((len(catalog), HISTORY_DAYS))
+        np.add.at(
+            per_product,
+            (product_index[unknown], days[unknown]),
+            quantities[unknown],
+        )
+        branch_counts = np.bincount(row_product)
+        demand += per_product[row_product] / branch_counts[row_product, None]
+
+    return demand
+
+
+def fit_models(demand):
+    """
+    One-step-ahead moving average and exponential smoothing forecasts for
+    every series. Returns (model_index, daily_demand, sigma) arrays.
+    """
+    window = MOVING_AVERAGE_DAYS
+    n_series, n_days = demand.shape
+
+    # Moving average forecast of day t = mean of days t-window .. t-1
+    totals = np.concatenate([np.zeros((n_series, 1)), np.cumsum(demand, axis=1)], 1)
+    moving_average = (totals[:, window:] - totals[:, :-window]) / window
+
+    # Exponential smoothing, warmed up with the first window's mean
+    smoothing = np.empty((n_series, n_days - window + 1))
+    level = moving_average[:, 0]
+    for t in range(window, n_days):
+        smoothing[:, t - window] = level
+        level = SMOOTHING_ALPHA * demand[:, t] + (1 - SMOOTHING_ALPHA) * level
+    smoothing[:, -1] = level
+
+    # The last column of each is the forecast for tomorrow; the rest is
+    # scored against what actually happened
+    actual = demand[:, window:]
+    errors = np.stack([actual - moving_average[:, :-1], actual - smoothing[:, :-1]])
+    model_index = np.argmin(np.abs(errors).mean(axis=2), axis=0)
+    series = np.arange(n_series)
+
+    forecasts = np.stack([moving_average[:, -1], smoothing[:, -1]])
+    daily_demand = forecasts[model_index, series]
+    sigma = np.sqrt((errors[model_index, series] ** 2).mean(axis=1))
+    return model_index, daily_demand, sigma
+
+
+def reorder_levels(daily_demand, sigma, maximum_stock):
+    """(reorder_point, order_up_to) per series"""
+    safety_stock = SERVICE_LEVEL_Z * sigma * np.sqrt(LEAD_TIME_DAYS)
+    reorder_point = np.ceil(daily_demand * LEAD_TIME_DAYS + safety_stock)
+    order_up_to = np.ceil(reorder_point + daily_demand * REVIEW_PERIOD_DAYS)
+
+    # Respect branch capacity, but never order up to less than the reorder point
+    capped = np.where(maximum_stock > 0, maximum_stock, order_up_to)
+    order_up_to = np.maximum(np.minimum(order_up_to, capped), reorder_point)
+    return reorder_point.astype(np.int64), order_up_to.astype(np.int64)
+
+
+def build_demand_forecast(cnx, cursor):
+    """Recompute INVENTORY_FORECAST for every INVENTORY row with recent sales"""
+    print("[INFO] Building demand forecasts...")
+    inventory_ids, product_ids, branch_ids, maximum_stock = load_inventory(cursor)
+    demand = build_demand_matrix(product_ids, branch_ids, fetch_daily_demand(cursor))
+
+    selling = demand.sum(axis=1) > 0
+    print(f"[INFO] {selling.sum()} of {len(inventory_ids)} inventory rows have sales")
+
+    model_index, daily_demand, sigma = fit_models(demand[selling])
+    reorder_point, order_up_to = reorder_levels(
+        daily_demand, sigma, maximum_stock[selling]
+    )
+
+    rows = [
+        (
+            int(inventory_id),
+            MODELS[model],
+            round(float(rate), 3),
+            round(float(spread), 3),
+            int(point),
+            int(target),
+        )
+        for inventory_id, model, rate, spread, point, target in zip(
+            inventory_ids[selling],
+            model_index,
+            daily_demand,
+            sigma,
+            reorder_point,
+            order_up_to,
+        )
+    ]
+
+    cursor.execute("DELETE FROM INVENTORY_FORECAST")
+    for i in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(
+            """
+            INSERT INTO INVENTORY_FORECAST
+            (inventory_id, model, daily_demand, demand_std, reorder_point, order_up_to)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """,
+            rows[i : i + BATCH_SIZE],
+        )
+    cnx.commit()
+
+    print(f"[OK] {len(rows)} forecasts written")
+    return len(rows)
+
+
+def main():
+    """Connect to the database and rebuild INVENTORY_FORECAST"""
+    cnx = None
+    cursor = None
+    try:
+        cnx = mysql.connector.connect(
+            host=DB_HOST,
+            user=DB_USER,
+            password=DB_PASS,
+            port=int(DB_PORT),
+            database=DB_NAME,
+        )
+        cursor = cnx.cursor()
+        build_demand_forecast(cnx, cursor)
+
+    except mysql.connector.Error as err:
+        print(f"[X] Database error: {err}")
+        if cnx:
+            cnx.rollback()
+    finally:
+        if cursor:
+            cursor.close()
+        if cnx:
+            cnx.close()
+
+
+if __name__ == "__main__":
+    main()
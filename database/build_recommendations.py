@@ -0,0 +1,325 @@
+"""
+Co-Purchase Recommendation Builder for Game Store Database
+Builds "customers also bought" neighbours from ORDER_DETAIL.
+
+Orders moved to the archive tables are read through the VIEW_*_HISTORY
+views, so a full rebuild keeps their co-purchases.
+
+The co-purchase matrix is kept sparse in PRODUCT_COPURCHASE (one row per
+product pair that appeared in the same order) and the top-K neighbours of
+every product are written to PRODUCT_RELATED, which the API reads by
+primary key.
+
+Usage:
+    python database/build_recommendations.py                # full rebuild
+    python database/build_recommendations.py --incremental  # new orders only
+
+Incremental runs only add orders placed since the previous run. Orders
+cancelled after they were counted stay in the matrix until the next full
+rebuild, so schedule a full rebuild periodically (e.g. nightly).
+"""
+
+import mysql.connector
+import os
+import sys
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+DB_HOST = os.getenv("DB_HOST")
+DB_USER = os.getenv("DB_USER")
+DB_PASS = os.getenv("DB_PASS")
+DB_NAME = os.getenv("DB_NAME")
+DB_PORT = os.getenv("DB_PORT")
+
+# Configuration
+TOP_K = 10  # Neighbours stored per product
+BATCH_SIZE = 1000  # Rows per multi-row INSERT / IN (...) list
+JOB_NAME = "copurchase_recommendations"
+
+
+def fetch_order_lines(cursor, after_order_id=0):
+    """Return (order_ids, product_ids) arrays of distinct non-cancelled order lines"""
+    cursor.execute(
+        """
+        SELECT DISTINCT od.order_id, od.product_id
+        FROM VIEW_ORDER_DETAIL_HISTORY od
+        JOIN VIEW_ORDER_HISTORY o ON od.order_id = o.order_id
+        WHERE od.order_id > %s
+          AND od.product_id IS NOT NULL
+          AND o.order_status != 'cancelled'
+    """,
+        (after_order_id,),
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    lines = np.array(rows, dtype=np.int64)
+    return lines[:, 0], lines[:, 1]
+
+
+def count_pairs(order_ids, product_ids):
+    """
+    Vectorized self-join of order lines on order_id.
+    Returns (product_a, product_b, pair_count) for every ordered pair a != b.
+    """
+    if len(order_ids) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+
+    order = np.argsort(order_ids, kind="stable")
+    orders = order_ids[order]
+    products = product_ids[order]
+
+    # Each line is paired with every line of its own order
+    _, starts, sizes = np.unique(orders, return_index=True, return_counts=True)
+    line_sizes = np.repeat(sizes, sizes)
+    line_starts = np.repeat(starts, sizes)
+
+    left = np.repeat(np.arange(len(orders)), line_sizes)
+    offsets = np.arange(len(left)) - np.repeat(
+        np.cumsum(line_sizes) - line_sizes, line_sizes
+    )
+    right = np.repeat(line_starts, line_sizes) + offsets
+
+    mask = left != right
+    product_a = products[left[mask]]
+    product_b = products[right[mask]]
+
+    # Encode pairs as single integers so np.unique can count them
+    base = int(products.max()) + 1
+    keys, pair_counts = np.unique(product_a * base + product_b, return_counts=True)
+    return keys // base, keys % base, pair_counts
+
+
+def top_k_neighbours(product_a, product_b, pair_counts, order_counts, k=TOP_K):
+    """
+    Rank neighbours of each product by cosine similarity
+    (pair_count / sqrt(orders_a * orders_b)) and keep the best k.
+    order_counts maps product_id -> number of orders containing it.
+    Returns (product_a, rank_no, product_b, pair_count, score) arrays.
+    """
+    if len(product_a) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty, np.empty(0)
+
+    lookup = np.vectorize(lambda pid: order_counts.get(int(pid), 1), otypes=[float])
+    scores = pair_counts / np.sqrt(lookup(product_a) * lookup(product_b))
+
+    # Sort by product, then score desc, then pair_count desc
+    order = np.lexsort((-pair_counts, -scores, product_a))
+    product_a = product_a[order]
+    product_b = product_b[order]
+    pair_counts = pair_counts[order]
+    scores = scores[order]
+
+    _, starts, sizes = np.unique(product_a, return_index=True, return_counts=True)
+    ranks = np.arange(len(product_a)) - np.repeat(starts, sizes)
+    keep = ranks < k
+
+    return (
+        product_a[keep],
+        ranks[keep] + 1,
+        product_b[keep],
+        pair_counts[keep],
+        scores[keep],
+    )
+
+
+def fetch_order_counts(cursor, product_ids):
+    """Number of non-cancelled orders containing each product"""
+    order_counts = {}
+    product_ids = [int(pid) for pid in product_ids]
+    for i in range(0, len(product_ids), BATCH_SIZE):
+        chunk = product_ids[i : i + BATCH_SIZE]
+        placeholders = ",".join(["%s"] * len(chunk))
+        cursor.execute(
+            """
+            SELECT od.product_id, COUNT(DISTINCT od.order_id)
+            FROM VIEW_ORDER_DETAIL_HISTORY od
+            JOIN VIEW_ORDER_HISTORY o ON od.order_id = o.order_id
+            WHERE o.order_status != 'cancelled'
+              AND od.product_id IN ("""
+            + placeholders
+            + """)
+            GROUP BY od.product_id
+        """,
+            chunk,
+        )
+        order_counts.update({row[0]: row[1] for row in cursor.fetchall()})
+    return order_counts
+
+
+def insert_rows(cursor, query, rows):
+    """executemany in BATCH_SIZE chunks"""
+    for i in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(query, rows[i : i + BATCH_SIZE])
+
+
+def write_related(cursor, neighbours, product_ids=None):
+    """Replace PRODUCT_RELATED rows (all, or only for the given products)"""
+    if product_ids is None:
+        cursor.execute("DELETE FROM PRODUCT_RELATED")
+    else:
+        product_ids = [int(pid) for pid in product_ids]
+        for i in range(0, len(product_ids), BATCH_SIZE):
+            chunk = product_ids[i : i + BATCH_SIZE]
+            placeholders = ",".join(["%s"] * len(chunk))
+            cursor.execute(
+                "DELETE FROM PRODUCT_RELATED WHERE product_id IN ("
+                + placeholders
+                + ")",
+                chunk,
+            )
+
+    product_a, ranks, product_b, pair_counts, scores = neighbours
+    rows = [
+        (int(a), int(rank), int(b), int(count), round(float(score), 5))
+        for a, rank, b, count, score in zip(
+            product_a, ranks, product_b, pair_counts, scores
+        )
+    ]
+    insert_rows(
+        cursor,
+        """
+        INSERT INTO PRODUCT_RELATED (product_id, rank_no, related_product_id, pair_count, score)
+        VALUES (%s, %s, %s, %s, %s)
+    """,
+        rows,
+    )
+    return len(rows)
+
+
+def save_watermark(cursor, last_order_id):
+    cursor.execute(
+        """
+        INSERT INTO JOB_STATE (job_name, last_processed_id)
+        VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE last_processed_id = VALUES(last_processed_id)
+    """,
+        (JOB_NAME, last_order_id),
+    )
+
+
+def full_rebuild(cnx, cursor):
+    """Recompute the whole co-purchase matrix and all neighbour lists"""
+    print("[INFO] Full rebuild: reading ORDER_DETAIL...")
+    order_ids, product_ids = fetch_order_lines(cursor)
+    print(f"[INFO] {len(order_ids)} order lines loaded")
+
+    product_a, product_b, pair_counts = count_pairs(order_ids, product_ids)
+    print(f"[INFO] {len(product_a)} product pairs counted")
+
+    cursor.execute("DELETE FROM PRODUCT_COPURCHASE")
+    insert_rows(
+        cursor,
+        """
+        INSERT INTO PRODUCT_COPURCHASE (product_id, related_product_id, pair_count)
+        VALUES (%s, %s, %s)
+    """,
+        [
+            (int(a), int(b), int(count))
+            for a, b, count in zip(product_a, product_b, pair_counts)
+        ],
+    )
+
+    products, counts = np.unique(product_ids, return_counts=True)
+    order_counts = dict(zip(products.tolist(), counts.tolist()))
+    neighbours = top_k_neighbours(product_a, product_b, pair_counts, order_counts)
+    written = write_related(cursor, neighbours)
+
+    save_watermark(cursor, int(order_ids.max()) if len(order_ids) else 0)
+    cnx.commit()
+    print(f"[OK] {written} neighbour rows written")
+
+
+def incremental_refresh(cnx, cursor):
+    """Fold orders placed since the last run into the matrix"""
+    cursor.execute(
+        "SELECT last_processed_id FROM JOB_STATE WHERE job_name = %s", (JOB_NAME,)
+    )
+    state = cursor.fetchone()
+    if not state:
+        print("[INFO] No previous run found, falling back to a full rebuild")
+        return full_rebuild(cnx, cursor)
+
+    order_ids, product_ids = fetch_order_lines(cursor, state[0])
+    if len(order_ids) == 0:
+        print("[INFO] No new orders since the last run")
+        return
+
+    print(f"[INFO] {len(order_ids)} new order lines since order #{state[0]}")
+    product_a, product_b, pair_counts = count_pairs(order_ids, product_ids)
+
+    insert_rows(
+        cursor,
+        """
+        INSERT INTO PRODUCT_COPURCHASE (product_id, related_product_id, pair_count)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE pair_count = pair_count + VALUES(pair_count)
+    """,
+        [
+            (int(a), int(b), int(count))
+            for a, b, count in zip(product_a, product_b, pair_counts)
+        ],
+    )
+
+    # Re-rank only the products that appeared in the new orders
+    affected = np.unique(product_a).tolist()
+    rows = []
+    for i in range(0, len(affected), BATCH_SIZE):
+        chunk = affected[i : i + BATCH_SIZE]
+        placeholders = ",".join(["%s"] * len(chunk))
+        cursor.execute(
+            "SELECT product_id, related_product_id, pair_count FROM PRODUCT_COPURCHASE"
+            " WHERE product_id IN (" + placeholders + ")",
+            chunk,
+        )
+        rows.extend(cursor.fetchall())
+
+    pairs = np.array(rows, dtype=np.int64).reshape(-1, 3)
+    order_counts = fetch_order_counts(cursor, np.unique(pairs[:, :2]))
+    neighbours = top_k_neighbours(pairs[:, 0], pairs[:, 1], pairs[:, 2], order_counts)
+    written = write_related(cursor, neighbours, affected)
+
+    save_watermark(cursor, int(order_ids.max()))
+    cnx.commit()
+    print(f"[OK] {len(affected)} products re-ranked, {written} neighbour rows written")
+
+
+def main():
+    """Connect to the database and run a full or incremental build"""
+    incremental = "--incremental" in sys.argv[1:]
+
+    cnx = None
+    cursor = None
+    try:
+        cnx = mysql.connector.connect(
+            host=DB_HOST,
+            user=DB_USER,
+            password=DB_PASS,
+            port=int(DB_PORT),
+            database=DB_NAME,
+        )
+        cursor = cnx.cursor()
+
+        if incremental:
+            incremental_refresh(cnx, cursor)
+        else:
+            full_rebuild(cnx, cursor)
+
+    except mysql.connector.Error as err:
+        print(f"[X] Database error: {err}")
+        if cnx:
+            cnx.rollback()
+    finally:
+        if cursor:
+            cursor.close()
+        if cnx:
+            cnx.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Content-Based Similar Games Builder for Game Store Database
+Precomputes "similar games" from catalog attributes so that products
+without purchase history still get recommendations.
+
+Each game is encoded as a sparse feature vector (CSR arrays) over its
+genres (GAME_GENRE), platforms, developers, publishers and ESRB rating.
+Features are IDF weighted, rows are L2 normalised and cosine top-K
+neighbours are computed in blocks by walking the posting list of every
+feature a block's games carry. Results go to PRODUCT_SIMILAR.
+
+dataload.py runs this automatically after loading the catalog; it can also
+be run on its own:
+    python database/build_similar_games.py
+"""
+
+import mysql.connector
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+DB_HOST = os.getenv("DB_HOST")
+DB_USER = os.getenv("DB_USER")
+DB_PASS = os.getenv("DB_PASS")
+DB_NAME = os.getenv("DB_NAME")
+DB_PORT = os.getenv("DB_PORT")
+
+# Configuration
+TOP_K = 10  # Neighbours stored per game
+BLOCK_SIZE = 1000  # Rows per similarity block (BLOCK_SIZE x games scores in memory)
+BATCH_SIZE = 1000  # Rows per multi-row INSERT
+MIN_SCORE = 0.05  # Pairs below this similarity are not stored
+
+# Relative importance of each attribute group
+FEATURE_WEIGHTS = {
+    "genre": 1.0,
+    "platform": 0.5,
+    "developer": 1.5,
+    "publisher": 1.0,
+    "esrb": 0.5,
+}
+
+# Placeholder values written by dataload.py when IGDB has no data
+UNKNOWN_VALUES = {"", "Bilinmiyor", "N/A"}
+
+
+def split_values(value):
+    """Split comma separated GAME columns into clean values"""
+    if not value:
+        return []
+    return [v.strip() for v in value.split(",") if v.strip() not in UNKNOWN_VALUES]
+
+
+def load_game_features(cursor):
+    """Return (product_ids, {product_id: [(group, value), ...]})"""
+    cursor.execute(
+        "SELECT product_id, platform, developer, publisher, ESRB_rating FROM GAME"
+    )
+    features = {}
+    for product_id, platform, developer, publisher, esrb in cursor.fetchall():
+        game_features = [("platform", v) for v in split_values(platform)]
+        game_features += [("developer", v) for v in split_values(developer)]
+        game_features += [("publisher", v) for v in split_values(publisher)]
+        if esrb and esrb not in UNKNOWN_VALUES:
+            game_features.append(("esrb", esrb))
+        features[product_id] = game_features
+
+    cursor.execute("SELECT product_id, genre_id FROM GAME_GENRE")
+    for product_id, genre_id in cursor.fetchall():
+        if product_id in features:
+            features[product_id].append(("genre", genre_id))
+
+    product_ids = sorted(features)
+    return product_ids, features
+
+
+def build_feature_matrix(product_ids, features):
+    """
+    Encode games as IDF-weighted, L2-normalised sparse feature rows in CSR
+    form: (indptr, indices, data, n_columns). Row i holds data[indptr[i]:
+    indptr[i + 1]] at columns indices[indptr[i]:indptr[i + 1]]. A game only
+    has a handful of features, so memory grows with the number of
+    game/feature pairs, not games x features.
+    Features carried by a single game can never contribute to a dot
+    product with another game, so they are dropped to keep the matrix narrow.
+    """
+    document_frequency = {}
+    for product_id in product_ids:
+        for feature in set(features[product_id]):
+            document_frequency[feature] = document_frequency.get(feature, 0) + 1
+
+    shared = sorted((f for f, df in document_frequency.items() if df >= 2), key=str)
+    columns = {feature: i for i, feature in enumerate(shared)}
+
+    n_games = len(product_ids)
+    indptr = [0]
+    indices = []
+    data = []
+    for product_id in product_ids:
+        row = sorted(
+            (columns[feature], feature)
+            for feature in set(features[product_id])
+            if feature in columns
+        )
+        for column, feature in row:
+            idf = np.log(n_games / document_frequency[feature])
+            indices.append(column)
+            data.append(FEATURE_WEIGHTS[feature[0]] * max(idf, 0.1))
+        indptr.append(len(indices))
+
+    indptr = np.array(indptr, dtype=np.int64)
+    indices = np.array(indices, dtype=np.int64)
+    data = np.array(data, dtype=np.float32)
+
+    rows = np.repeat(np.arange(n_games), np.diff(indptr))
+    norms = np.sqrt(np.bincount(rows, weights=data**2, minlength=n_games))
+    norms[norms == 0] = 1
+    return indptr, indices, (data / norms[rows]).astype(np.float32), len(columns)
+
+
+def similarity_block(matrix, columns, start, stop):
+    """
+    Dense cosine scores of rows start..stop against every row. Each
+    non-zero of the block is multiplied with the posting list of its
+    column (columns: CSC view of the matrix), so only games that share a
+    feature are ever touched.
+    """
+    indptr, indices, data, _ = matrix
+    column_ptr, column_rows, column_data = columns
+    n_games = len(indptr) - 1
+
+    nz = np.arange(indptr[start], indptr[stop])
+    rows = np.repeat(np.arange(stop - start), np.diff(indptr[start : stop + 1]))
+    cols = indices[nz]
+
+    # Expand every non-zero to the posting list of its column
+    sizes = column_ptr[cols + 1] - column_ptr[cols]
+    offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    postings = np.repeat(column_ptr[cols], sizes) + offsets
+
+    flat = np.repeat(rows, sizes) * n_games + column_rows[postings]
+    weights = np.repeat(data[nz], sizes) * column_data[postings]
+    block = np.bincount(flat, weights=weights, minlength=(stop - start) * n_games)
+    return block.reshape(stop - start, n_games)
+
+
+def top_k_similar(matrix, k=TOP_K):
+    """
+    Blocked cosine top-K over a CSR matrix from build_feature_matrix.
+    Yields (row, neighbour_rows, scores) per game, best first, skipping
+    neighbours below MIN_SCORE.
+    """
+    indptr, indices, data, n_columns = matrix
+    n_games = len(indptr) - 1
+    k = min(k, n_games - 1)
+    if k <= 0:
+        return
+
+    # Column-major copy: the games carrying each feature
+    order = np.argsort(indices, kind="stable")
+    rows = np.repeat(np.arange(n_games), np.diff(indptr))
+    column_ptr = np.concatenate(
+        [[0], np.cumsum(np.bincount(indices, minlength=n_columns))]
+    ).astype(np.int64)
+    columns = (column_ptr, rows[order], data[order])
+
+    for start in range(0, n_games, BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, n_games)
+        block = similarity_block(matrix, columns, start, stop)
+        # A game is not its own neighbour
+        rows = np.arange(block.shape[0])
+        block[rows, rows + start] = -1
+
+        candidates = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        candidate_scores = np.take_along_axis(block, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1)
+        candidates = np.take_along_axis(candidates, order, axis=1)
+        candidate_scores = np.take_along_axis(candidate_scores, order, axis=1)
+
+        for i in rows:
+            keep = candidate_scores[i] >= MIN_SCORE
+            yield start + i, candidates[i][keep], candidate_scores[i][keep]
+
+
+def build_similar_games(cnx, cursor):
+    """Recompute PRODUCT_SIMILAR for the whole catalog"""
+    print("[INFO] Building content-based similar games...")
+    product_ids, features = load_game_features(cursor)
+    if len(product_ids) < 2:
+        print("[INFO] Not enough games to compare, skipping")
+        return 0
+
+    matrix = build_feature_matrix(product_ids, features)
+    print(
+        f"[INFO] {len(product_ids)} games x {matrix[3]} shared features,"
+        f" {len(matrix[1])} non-zeros"
+    )
+
+    rows = []
+    for row, neighbours, scores in top_k_similar(matrix):
+        for rank, (neighbour, score) in enumerate(zip(neighbours, scores), start=1):
+            rows.append(
+                (
+                    product_ids[row],
+                    rank,
+                    product_ids[neighbour],
+                    round(float(score), 5),
+                )
+            )
+
+    cursor.execute("DELETE FROM PRODUCT_SIMILAR")
+    for i in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(
+            """
+            INSERT INTO PRODUCT_SIMILAR (product_id, rank_no, similar_product_id, score)
+            VALUES (%s, %s, %s, %s)
+        """,
+            rows[i : i + BATCH_SIZE],
+        )
+    cnx.commit()
+
+    print(f"[OK] {len(rows)} similar game rows written")
+    return len(rows)
+
+
+def main():
+    """Connect to the database and rebuild PRODUCT_SIMILAR"""
+    cnx = None
+    cursor = None
+    try:
+        cnx = mysql.connector.connect(
+            host=DB_HOST,
+            user=DB_USER,
+            password=DB_PASS,
+            port=int(DB_PORT),
+            database=DB_NAME,
+        )
+        cursor = cnx.cursor()
+        build_similar_games(cnx, cursor)
+
+    except mysql.connector.Error as err:
+        print(f"[X] Database error: {err}")
+        if cnx:
+            cnx.rollback()
+    finally:
+        if cursor:
+            cursor.close()
+        if cnx:
+            cnx.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ import os
 import random
 from dotenv import load_dotenv
 from igdb_service import wrapper
+from build_similar_games import build_similar_games
 
 # 2. VERİTABANI BİLGİLERİNİ .env DOSYASINDAN YÜKLE
 load_dotenv()
@@ -48,6 +49,24 @@ def clear_data(cnx, cursor):
         "PRODUCT",
         "GENRE",
         "INVENTORY",
+        "JOB_STATE",
+        "PRODUCT_COPURCHASE",
+        "PRODUCT_RELATED",
+        "PRODUCT_SIMILAR",
+        "LEADERBOARD_SALES",
+        "RESERVATION",
+        "IDEMPOTENCY_KEY",
+        "OUTBOX",
+        "OUTBOX_DEAD_LETTER",
+        "INVENTORY_MOVEMENT",
+        "INVENTORY_SNAPSHOT",
+        "STOCK_LOG_DAILY",
+        "ORDER_ARCHIVE",
+        "ORDER_DETAIL_ARCHIVE",
+        "SALE_ARCHIVE",
+        "RETURN_ARCHIVE",
+        "ORDER_ARCHIVE_TOTALS",
+        "INVENTORY_FORECAST",
     ]
 
     try:
@@ -703,6 +722,9 @@ def main():
         # --- 4. Adım: Konsolları Yükle ---
         load_consoles(cnx, cursor)
 
+        # --- 5. Adım: Benzer Oyunları Hesapla (PRODUCT_SIMILAR) ---
+        build_similar_games(cnx, cursor)
+
         print("Tüm işlemler başarıyla tamamlandı!")
 
     except mysql.connector.Error as err:
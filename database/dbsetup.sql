@@ -319,6 +319,7 @@ CREATE TABLE IF NOT EXISTS `INVENTORY` (
   `maximum_stock` INT DEFAULT 100,
   `shelf_location` VARCHAR(50),
   `last_update_date` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  `version` INT NOT NULL DEFAULT 0,
   PRIMARY KEY (`inventory_id`),
   UNIQUE KEY `uk_product_branch` (`product_id`, `branch_id`),
   CONSTRAINT `fk_inv_product`
@@ -342,11 +343,17 @@ CREATE INDEX idx_product_type ON PRODUCT(product_type);
 
 -- Sipariş sorguları için indeksler
 CREATE INDEX idx_order_date ON `ORDER`(order_date);
-CREATE INDEX idx_order_customer ON `ORDER`(customer_id);
+-- Müşteri sipariş geçmişinin (order_date, order_id) üzerinden keyset sayfalanması için
+CREATE INDEX idx_order_customer_date ON `ORDER`(customer_id, order_date);
 
 -- Oyun filtreleme için indeks
 CREATE INDEX idx_game_rating ON GAME(ESRB_rating);
 
+-- Ürün yorumlarının sayfalı (keyset) listelenmesi için indeksler
+CREATE INDEX idx_review_product_date ON REVIEW(product_id, approved, review_date);
+CREATE INDEX idx_review_product_helpful ON REVIEW(product_id, approved, helpful_count);
+CREATE INDEX idx_review_product_rating ON REVIEW(product_id, approved, rating);
+
 -- 4.2 VIEWS (Karmaşık Sorguları Basitleştirmek İçin)
 
 -- VIEW 1: VIEW_PRODUCT_DETAILS
@@ -446,6 +453,11 @@ CREATE TABLE IF NOT EXISTS `STOCK_LOG` (
   `new_quantity` INT,
   `change_date` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (`log_id`),
+  -- Stok geçmişinin (change_date, log_id) üzerinden keyset sayfalanması ve
+  -- ürün/şube + tarih aralığı filtreleri için
+  KEY `idx_stock_log_date` (`change_date`, `log_id`),
+  KEY `idx_stock_log_product_date` (`product_id`, `change_date`, `log_id`),
+  KEY `idx_stock_log_branch_date` (`branch_id`, `change_date`, `log_id`),
   CONSTRAINT `fk_log_product`
     FOREIGN KEY (`product_id`) REFERENCES `PRODUCT` (`product_id`)
     ON DELETE CASCADE,
@@ -466,4 +478,314 @@ BEGIN
         VALUES (NEW.product_id, NEW.branch_id, OLD.quantity, NEW.quantity, NOW());
     END IF;
 END//
-DELIMITER ;
\ No newline at end of file
+DELIMITER ;
+
+-- ============================================================================
+-- SIRA 6: PRECOMPUTED TABLES (ÖNERİLER VE ARKA PLAN İŞLERİ)
+-- ============================================================================
+
+-- JOB_STATE Table
+-- Artımlı (incremental) işlerin en son işlediği kaydı tutar
+CREATE TABLE IF NOT EXISTS `JOB_STATE` (
+  `job_name` VARCHAR(100) NOT NULL,
+  `last_processed_id` INT DEFAULT 0,
+  `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`job_name`)
+);
+
+-- PRODUCT_COPURCHASE Table
+-- Aynı siparişte birlikte alınan ürün çiftlerinin sayısı (iki yönlü saklanır)
+CREATE TABLE IF NOT EXISTS `PRODUCT_COPURCHASE` (
+  `product_id` INT NOT NULL,
+  `related_product_id` INT NOT NULL,
+  `pair_count` INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (`product_id`, `related_product_id`),
+  CONSTRAINT `fk_copurchase_product`
+    FOREIGN KEY (`product_id`) REFERENCES `PRODUCT` (`product_id`)
+    ON DELETE CASCADE,
+  CONSTRAINT `fk_copurchase_related`
+    FOREIGN KEY (`related_product_id`) REFERENCES `PRODUCT` (`product_id`)
+    ON DELETE CASCADE
+);
+
+-- PRODUCT_RELATED Table
+-- "Bunu alanlar şunları da aldı" için ürün başına önceden hesaplanmış top-K komşular
+CREATE TABLE IF NOT EXISTS `PRODUCT_RELATED` (
+  `product_id` INT NOT NULL,
+  `rank_no` INT NOT NULL,
+  `related_product_id` INT NOT NULL,
+  `pair_count` INT,
+  `score` DECIMAL(8, 5),
+  `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`product_id`, `rank_no`),
+  CONSTRAINT `fk_related_product`
+    FOREIGN KEY (`product_id`) REFERENCES `PRODUCT` (`product_id`)
+    ON DELETE CASCADE,
+  CONSTRAINT `fk_related_related`
+    FOREIGN KEY (`related_product_id`) REFERENCES `PRODUCT` (`product_id`)
+    ON DELETE CASCADE
+);
+
+-- PRODUCT_SIMILAR Table
+-- İçerik tabanlı (tür, platform, geliştirici, yayıncı, ESRB) benzer oyunlar
+-- dataload.py her çalıştığında build_similar_games.py ile yeniden hesaplanır
+CREATE TABLE IF NOT EXISTS `PRODUCT_SIMILAR` (
+  `product_id` INT NOT NULL,
+  `rank_no` INT NOT NULL,
+  `similar_product_id` INT NOT NULL,
+  `score` DECIMAL(8, 5),
+  `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`product_id`, `rank_no`),
+  CONSTRAINT `fk_similar_product`
+    FOREIGN KEY (`product_id`) REFERENCES `PRODUCT` (`product_id`)
+    ON DELETE CASCADE,
+  CONSTRAINT `fk_similar_similar`
+    FOREIGN KEY (`similar_product_id`) REFERENCES `PRODUCT` (`product_id`)
+    ON DELETE CASCADE
+);
+
+-- LEADERBOARD_SALES Table
+-- En çok satanlar için ürün başına saatlik satış adedi (outbox işleyicileri yazar)
+-- version: JOB_STATE'teki 'leaderboard_sales' sayacı; süreçler yalnızca
+-- son eşitlemeden sonra değişen satırları okur
+CREATE TABLE IF NOT EXISTS `LEADERBOARD_SALES` (
+  `bucket_hour` INT NOT NULL,
+  `product_id` INT NOT NULL,
+  `units` INT NOT NULL DEFAULT 0,
+  `version` BIGINT NOT NULL,
+  PRIMARY KEY (`bucket_hour`, `product_id`),
+  KEY `idx_leaderboard_version` (`version`)
+);
+
+-- ============================================================================
+-- SIRA 7: CHECKOUT TABLES (REZERVASYON VE SİPARİŞ GÜVENLİĞİ)
+-- ============================================================================
+
+-- RESERVATION Table
+-- Müşteri ödeme sayfasındayken stoğu süreli olarak ayırır (INVENTORY'den düşülmez).
+-- Süresi dolan kayıtlar sorgularda yok sayılır, arka planda toplu silinir.
+CREATE TABLE IF NOT EXISTS `RESERVATION` (
+  `reservation_id` INT NOT NULL AUTO_INCREMENT,
+  `customer_id` INT NOT NULL,
+  `inventory_id` INT NOT NULL,
+  `quantity` INT NOT NULL,
+  `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  `expires_at` DATETIME NOT NULL,
+  PRIMARY KEY (`reservation_id`),
+  KEY `idx_reservation_customer` (`customer_id`, `expires_at`),
+  KEY `idx_reservation_inventory` (`inventory_id`, `expires_at`),
+  KEY `idx_reservation_expires` (`expires_at`),
+  CONSTRAINT `fk_reservation_customer`
+    FOREIGN KEY (`customer_id`) REFERENCES `CUSTOMER` (`customer_id`)
+    ON DELETE CASCADE,
+  CONSTRAINT `fk_reservation_inventory`
+    FOREIGN KEY (`inventory_id`) REFERENCES `INVENTORY` (`inventory_id`)
+    ON DELETE CASCADE,
+  CONSTRAINT `chk_reservation_quantity` CHECK (`quantity` > 0)
+);
+
+-- IDEMPOTENCY_KEY Table
+-- Tekrarlanan POST /api/orders isteklerinde ilk yanıtı geri döndürmek için saklar.
+-- Anahtar sipariş ile aynı transaction içinde yazılır; süresi dolanlar toplu silinir.
+CREATE TABLE IF NOT EXISTS `IDEMPOTENCY_KEY` (
+  `idem_key` VARCHAR(100) NOT NULL,
+  `request_hash` CHAR(64) NOT NULL,
+  `response_code` INT,
+  `response_body` TEXT,
+  `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  `expires_at` DATETIME NOT NULL,
+  PRIMARY KEY (`idem_key`),
+  KEY `idx_idempotency_expires` (`expires_at`)
+);
+
+-- OUTBOX Table
+-- Sipariş transaction'ı içinde yazılan olaylar; kritik olmayan yan etkiler
+-- (sıralama tabloları, önbellek vb.) commit sonrası arka planda toplu işlenir
+CREATE TABLE IF NOT EXISTS `OUTBOX` (
+  `event_id` BIGINT NOT NULL AUTO_INCREMENT,
+  `event_type` VARCHAR(50) NOT NULL,
+  `payload` TEXT NOT NULL,
+  `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  `available_at` DATETIME NOT NULL,
+  `attempts` INT NOT NULL DEFAULT 0,
+  `last_error` VARCHAR(500),
+  `processed_at` DATETIME,
+  PRIMARY KEY (`event_id`),
+  KEY `idx_outbox_pending` (`processed_at`, `available_at`)
+);
+
+-- OUTBOX_DEAD_LETTER Table
+-- Deneme hakkını (OUTBOX_MAX_ATTEMPTS) bitiren olaylar; job_history_cleanup
+-- işi OUTBOX'tan buraya taşır ve 30 gün sonra siler. Sayısı
+-- /api/admin/metrics/transactions yanıtında görünür
+CREATE TABLE IF NOT EXISTS `OUTBOX_DEAD_LETTER` (
+  `event_id` BIGINT NOT NULL,
+  `event_type` VARCHAR(50) NOT NULL,
+  `payload` TEXT NOT NULL,
+  `created_at` TIMESTAMP NULL,
+  `attempts` INT NOT NULL,
+  `last_error` VARCHAR(500),
+  `failed_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`event_id`),
+  KEY `idx_outbox_dead_failed` (`failed_at`)
+);
+
+-- JOB_RUN Table
+-- app.py içindeki zamanlayıcının çalıştırdığı arka plan işlerinin geçmişi
+CREATE TABLE IF NOT EXISTS `JOB_RUN` (
+  `run_id` BIGINT NOT NULL AUTO_INCREMENT,
+  `job_name` VARCHAR(100) NOT NULL,
+  `status` VARCHAR(20) NOT NULL,
+  `attempts` INT NOT NULL DEFAULT 0,
+  `started_at` DATETIME NOT NULL,
+  `finished_at` DATETIME,
+  `duration_ms` INT,
+  `result` VARCHAR(500),
+  `error` VARCHAR(500),
+  PRIMARY KEY (`run_id`),
+  KEY `idx_job_run_name` (`job_name`, `run_id`),
+  KEY `idx_job_run_started` (`started_at`),
+  CONSTRAINT `chk_job_run_status` CHECK (`status` IN ('running', 'success', 'failed'))
+);
+
+-- INVENTORY_MOVEMENT Table
+-- Uygulamanın stok değiştiren her transaction içinde yazdığı, yalnızca eklenen
+-- stok hareket defteri (neden kodu, kaynak belge ve miktar farkı ile).
+-- reference_id: sale/offline_sale/cancel/order_return -> order_id,
+-- restock -> purchase_id, return -> return_id, transfer_in/transfer_out -> NULL
+-- (return: tek bir iade talebinin tamamlanması; order_return: siparişin
+-- yönetici tarafından "returned" durumuna alınmasıyla tüm kalemlerin iadesi)
+CREATE TABLE IF NOT EXISTS `INVENTORY_MOVEMENT` (
+  `movement_id` BIGINT NOT NULL AUTO_INCREMENT,
+  `inventory_id` INT NOT NULL,
+  `movement_type` VARCHAR(20) NOT NULL,
+  `reference_id` INT,
+  `delta` INT NOT NULL,
+  `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`movement_id`),
+  KEY `idx_movement_inventory` (`inventory_id`, `movement_id`),
+  KEY `idx_movement_reference` (`movement_type`, `reference_id`),
+  KEY `idx_movement_created` (`created_at`),
+  CONSTRAINT `fk_movement_inventory`
+    FOREIGN KEY (`inventory_id`) REFERENCES `INVENTORY` (`inventory_id`)
+    ON DELETE CASCADE,
+  CONSTRAINT `chk_movement_type` CHECK (`movement_type` IN (
+    'sale', 'offline_sale', 'restock', 'transfer_in', 'transfer_out', 'return',
+    'order_return', 'cancel'
+  )),
+  CONSTRAINT `chk_movement_delta` CHECK (`delta` != 0)
+);
+
+-- INVENTORY_SNAPSHOT Table
+-- Periyodik stok görüntüleri. Geçmiş bir andaki stok = o andan önceki son
+-- görüntü + last_movement_id sonrasındaki hareketlerin toplamı
+CREATE TABLE IF NOT EXISTS `INVENTORY_SNAPSHOT` (
+  `inventory_id` INT NOT NULL,
+  `snapshot_at` DATETIME NOT NULL,
+  `quantity` INT NOT NULL,
+  `last_movement_id` BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (`inventory_id`, `snapshot_at`),
+  KEY `idx_snapshot_at` (`snapshot_at`),
+  CONSTRAINT `fk_snapshot_inventory`
+    FOREIGN KEY (`inventory_id`) REFERENCES `INVENTORY` (`inventory_id`)
+    ON DELETE CASCADE
+);
+
+-- STOCK_LOG_DAILY Table
+-- Saklama süresini (retention) aşan STOCK_LOG kayıtlarının gün, ürün ve şube
+-- bazında sıkıştırılmış özeti; ham kayıtlar özetlendikten sonra silinir
+CREATE TABLE IF NOT EXISTS `STOCK_LOG_DAILY` (
+  `product_id` INT NOT NULL,
+  `branch_id` INT NOT NULL,
+  `summary_date` DATE NOT NULL,
+  `first_quantity` INT,
+  `last_quantity` INT,
+  `total_in` INT NOT NULL DEFAULT 0,
+  `total_out` INT NOT NULL DEFAULT 0,
+  `change_count` INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (`product_id`, `branch_id`, `summary_date`),
+  KEY `idx_stock_log_daily_date` (`summary_date`),
+  KEY `idx_stock_log_daily_branch` (`branch_id`, `summary_date`),
+  CONSTRAINT `fk_log_daily_product`
+    FOREIGN KEY (`product_id`) REFERENCES `PRODUCT` (`product_id`)
+    ON DELETE CASCADE,
+  CONSTRAINT `fk_log_daily_branch`
+    FOREIGN KEY (`branch_id`) REFERENCES `BRANCH` (`branch_id`)
+    ON DELETE CASCADE
+);
+
+-- ============================================================================
+-- SIRA 8: ARCHIVE TABLES (KAPANMIŞ SİPARİŞLERİN SOĞUK ARŞİVİ)
+-- ============================================================================
+
+-- ORDER_ARCHIVE, ORDER_DETAIL_ARCHIVE, SALE_ARCHIVE, RETURN_ARCHIVE Tables
+-- Bir yıldan eski teslim edilmiş / iptal / iade siparişler, detayları, satış ve
+-- iade kayıtlarıyla birlikte bu tablolara taşınır (app.py archive_orders işi).
+-- Sütunlar canlı tablolarla aynıdır (LIKE); foreign key yoktur ve satırlar
+-- sıkıştırılmış (ROW_FORMAT=COMPRESSED) saklanır
+CREATE TABLE IF NOT EXISTS `ORDER_ARCHIVE` LIKE `ORDER`;
+ALTER TABLE `ORDER_ARCHIVE` ROW_FORMAT=COMPRESSED;
+
+CREATE TABLE IF NOT EXISTS `ORDER_DETAIL_ARCHIVE` LIKE `ORDER_DETAIL`;
+ALTER TABLE `ORDER_DETAIL_ARCHIVE` ROW_FORMAT=COMPRESSED;
+
+CREATE TABLE IF NOT EXISTS `SALE_ARCHIVE` LIKE `SALE`;
+ALTER TABLE `SALE_ARCHIVE` ROW_FORMAT=COMPRESSED;
+
+CREATE TABLE IF NOT EXISTS `RETURN_ARCHIVE` LIKE `RETURN`;
+ALTER TABLE `RETURN_ARCHIVE` ROW_FORMAT=COMPRESSED;
+
+-- ORDER_ARCHIVE_TOTALS Table
+-- Arşivlenen siparişlerin durum bazında sayısı ve tutarı; archive_orders işi
+-- her partide günceller. Yönetim panelinin tüm zamanlar toplamları arşivi
+-- taramadan canlı tablolar + bu tablodan hesaplanır
+CREATE TABLE IF NOT EXISTS `ORDER_ARCHIVE_TOTALS` (
+  `order_status` VARCHAR(20) NOT NULL,
+  `order_count` BIGINT NOT NULL DEFAULT 0,
+  `total_amount` DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`order_status`)
+);
+
+-- Bu tablodan önce arşivlenmiş siparişler (yalnızca ilk kurulumda eklenir)
+INSERT IGNORE INTO `ORDER_ARCHIVE_TOTALS` (order_status, order_count, total_amount)
+SELECT order_status, COUNT(*), COALESCE(SUM(total_amount), 0)
+FROM `ORDER_ARCHIVE`
+GROUP BY order_status;
+
+-- VIEW_ORDER_HISTORY, VIEW_ORDER_DETAIL_HISTORY
+-- Canlı ve arşiv tablolarını UNION ALL ile birleştirir; yalnızca arka plan
+-- işleri (öneriler, arama popülerliği) okur. Panel ve analitik sorguları
+-- canlı tablolarda kalır
+CREATE OR REPLACE VIEW VIEW_ORDER_HISTORY AS
+SELECT * FROM `ORDER`
+UNION ALL
+SELECT * FROM `ORDER_ARCHIVE`;
+
+CREATE OR REPLACE VIEW VIEW_ORDER_DETAIL_HISTORY AS
+SELECT * FROM `ORDER_DETAIL`
+UNION ALL
+SELECT * FROM `ORDER_DETAIL_ARCHIVE`;
+
+-- ============================================================================
+-- SIRA 9: FORECAST TABLES (TALEP TAHMİNİ VE YENİDEN SİPARİŞ NOKTALARI)
+-- ============================================================================
+
+-- INVENTORY_FORECAST Table
+-- Ürün-şube bazında günlük talep tahmini ve buna göre hesaplanan dinamik
+-- yeniden sipariş noktası (reorder_point) ile sipariş sonrası hedef stok
+-- (order_up_to); database/build_demand_forecast.py her gün yeniden hesaplar.
+-- Kaydı olmayan satırlarda statik stock_alert_level kullanılır
+CREATE TABLE IF NOT EXISTS `INVENTORY_FORECAST` (
+  `inventory_id` INT NOT NULL,
+  `model` VARCHAR(30) NOT NULL,
+  `daily_demand` DECIMAL(10, 3) NOT NULL,
+  `demand_std` DECIMAL(10, 3) NOT NULL,
+  `reorder_point` INT NOT NULL,
+  `order_up_to` INT NOT NULL,
+  `computed_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`inventory_id`),
+  CONSTRAINT `fk_forecast_inventory`
+    FOREIGN KEY (`inventory_id`) REFERENCES `INVENTORY` (`inventory_id`)
+    ON DELETE CASCADE,
+  CONSTRAINT `chk_forecast_model` CHECK (`model` IN ('moving_average', 'exponential_smoothing'))
+);
@@ -0,0 +1,381 @@
+"""
+Monthly Range Partitioning for Game Store Database
+Splits the history tables into one partition per calendar month so range
+scans over recent data and retention work only touch the months involved.
+
+    ORDER      by order_date
+    SALE       by transaction_date
+    STOCK_LOG  by change_date
+
+The columns are TIMESTAMPs, so partitions are ranges of
+UNIX_TIMESTAMP(column). A trailing `pmax` partition catches anything beyond
+the last month; maintain() splits it ahead of time so new rows always land
+in a real monthly partition.
+
+InnoDB cannot partition tables that have foreign keys or are referenced by
+one, and every unique key must contain the partition column. `migrate`
+therefore widens the primary keys to (id, date column) and, only with
+--drop-foreign-keys, drops these constraints:
+
+    ORDER.fk_order_customer         ORDER.customer_id -> CUSTOMER
+    ORDER_DETAIL.fk_od_order        ORDER_DETAIL.order_id -> ORDER
+    RETURN.fk_return_order          RETURN.order_id -> ORDER
+    SALE.fk_sale_order              SALE.order_id -> ORDER
+    SALE.fk_sale_customer           SALE.customer_id -> CUSTOMER
+    SALE.fk_sale_branch             SALE.branch_id -> BRANCH
+    STOCK_LOG.fk_log_product        STOCK_LOG.product_id -> PRODUCT
+    STOCK_LOG.fk_log_branch         STOCK_LOG.branch_id -> BRANCH
+
+Their ON DELETE actions are not needed: the application never deletes
+customers, products, branches or orders (archiving moves an order with all
+of its rows). Inserts are checked by the application instead: create_order
+verifies the customer, returns are only created for existing orders, SALE
+rows are written with the order they belong to, and STOCK_LOG rows come
+from the INVENTORY trigger (INVENTORY keeps its foreign keys). `check`
+(also run by maintain()) counts rows that break any of the dropped
+constraints.
+
+Queries that prune partitions (they bound the date column):
+    admin analytics (from/to, sent by the dashboard's period selector),
+    leaderboard load, demand forecast, stock log from/to filters and
+    keyset pages, order archiving.
+Queries left unbounded on purpose: lookups by order_id (the id alone does
+not tell the month; each partition answers from its primary key prefix),
+a customer's order history (keyset on order_date, so later pages prune)
+and the all-time totals, which have to read every month.
+
+Usage:
+    python database/partition_tables.py migrate --drop-foreign-keys
+    python database/partition_tables.py maintain   # add/archive partitions
+    python database/partition_tables.py check      # orphaned rows
+    python database/partition_tables.py status
+
+app.py runs maintain() daily as the partition_maintenance job.
+"""
+
+import mysql.connector
+import os
+import sys
+from datetime import date
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+DB_HOST = os.getenv("DB_HOST")
+DB_USER = os.getenv("DB_USER")
+DB_PASS = os.getenv("DB_PASS")
+DB_NAME = os.getenv("DB_NAME")
+DB_PORT = os.getenv("DB_PORT")
+
+# Table -> (primary key column, partition column)
+PARTITIONED_TABLES = {
+    "ORDER": ("order_id", "order_date"),
+    "SALE": ("sale_id", "transaction_date"),
+    "STOCK_LOG": ("log_id", "change_date"),
+}
+
+# Monthly partitions kept ready ahead of the current month
+FUTURE_MONTHS = 3
+
+# Partitions whose month ended more than this many months ago are detached:
+# empty ones are dropped, others are swapped out into a <TABLE>_Pyyyymm
+# archive table (EXCHANGE PARTITION, no row copying). None keeps everything.
+# STOCK_LOG rows are compacted into STOCK_LOG_DAILY after 90 days, so its old
+# partitions are normally empty by then.
+ARCHIVE_AFTER_MONTHS = {"ORDER": None, "SALE": None, "STOCK_LOG": 6}
+
+
+# (table, column, parent table, parent column) of the foreign keys migrate
+# drops, checked by check_integrity()
+DROPPED_FOREIGN_KEYS = [
+    ("ORDER", "customer_id", "CUSTOMER", "customer_id"),
+    ("ORDER_DETAIL", "order_id", "ORDER", "order_id"),
+    ("RETURN", "order_id", "ORDER", "order_id"),
+    ("SALE", "order_id", "ORDER", "order_id"),
+    ("SALE", "customer_id", "CUSTOMER", "customer_id"),
+    ("SALE", "branch_id", "BRANCH", "branch_id"),
+    ("STOCK_LOG", "product_id", "PRODUCT", "product_id"),
+    ("STOCK_LOG", "branch_id", "BRANCH", "branch_id"),
+]
+
+
+def add_months(month, count):
+    """First day of the month `count` months after `month`"""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"p{month.year}{month.month:02d}"
+
+
+def partition_definition(month):
+    """Partition holding rows of `month` (everything before the next month)"""
+    return (
+        f"PARTITION {partition_name(month)} VALUES LESS THAN "
+        f"(UNIX_TIMESTAMP('{add_months(month, 1).isoformat()}'))"
+    )
+
+
+def fetch_partitions(cursor, table):
+    """Monthly partition names of a table in order, [] if not partitioned"""
+    cursor.execute(
+        """
+        SELECT PARTITION_NAME
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+          AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """,
+        (table,),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def month_of(name):
+    """date for a pyyyymm partition name, None for pmax"""
+    if name == "pmax":
+        return None
+    return date(int(name[1:5]), int(name[5:7]), 1)
+
+
+def fetch_foreign_keys(cursor, table):
+    """(table, constraint) of foreign keys declared on or pointing at a table"""
+    cursor.execute(
+        """
+        SELECT TABLE_NAME, CONSTRAINT_NAME
+        FROM information_schema.REFERENTIAL_CONSTRAINTS
+        WHERE CONSTRAINT_SCHEMA = DATABASE()
+          AND (TABLE_NAME = %s OR REFERENCED_TABLE_NAME = %s)
+        ORDER BY TABLE_NAME, CONSTRAINT_NAME
+    """,
+        (table, table),
+    )
+    return cursor.fetchall()
+
+
+def migrate_table(cursor, table, drop_foreign_keys):
+    """Convert one table to monthly partitions. Returns True if it was changed"""
+    key_column, date_column = PARTITIONED_TABLES[table]
+    if fetch_partitions(cursor, table):
+        print(f"[INFO] {table} is already partitioned")
+        return False
+
+    foreign_keys = fetch_foreign_keys(cursor, table)
+    if foreign_keys and not drop_foreign_keys:
+        names = ", ".join(f"{t}.{c}" for t, c in foreign_keys)
+        print(f"[X] {table} has foreign keys ({names}); rerun with --drop-foreign-keys")
+        return False
+    for fk_table, constraint in foreign_keys:
+        print(f"[INFO] Dropping foreign key {fk_table}.{constraint}")
+        cursor.execute(f"ALTER TABLE `{fk_table}` DROP FOREIGN KEY `{constraint}`")
+
+    print(f"[INFO] {table}: primary key -> ({key_column}, {date_column})")
+    cursor.execute(
+        f"""
+        ALTER TABLE `{table}`
+        MODIFY `{date_column}` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        DROP PRIMARY KEY,
+        ADD PRIMARY KEY (`{key_column}`, `{date_column}`)
+    """
+    )
+
+    cursor.execute(f"SELECT MIN(`{date_column}`) FROM `{table}`")
+    oldest = cursor.fetchone()[0]
+    this_month = date.today().replace(day=1)
+    month = oldest.date().replace(day=1) if oldest else this_month
+    last = add_months(this_month, FUTURE_MONTHS)
+
+    definitions = []
+    while month <= last:
+        definitions.append(partition_definition(month))
+        month = add_months(month, 1)
+    definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+
+    print(f"[INFO] {table}: creating {len(definitions)} partitions")
+    cursor.execute(
+        f"ALTER TABLE `{table}` PARTITION BY RANGE (UNIX_TIMESTAMP(`{date_column}`)) ("
+        + ", ".join(definitions)
+        + ")"
+    )
+    return True
+
+
+def add_future_partitions(cursor, table, partitions):
+    """Split pmax so monthly partitions exist FUTURE_MONTHS ahead"""
+    months = [month_of(name) for name in partitions if month_of(name)]
+    last = add_months(date.today().replace(day=1), FUTURE_MONTHS)
+    month = add_months(months[-1], 1) if months else date.today().replace(day=1)
+
+    definitions = []
+    while month <= last:
+        definitions.append(partition_definition(month))
+        month = add_months(month, 1)
+    if not definitions:
+        return 0
+
+    cursor.execute(
+        f"ALTER TABLE `{table}` REORGANIZE PARTITION pmax INTO ("
+        + ", ".join(definitions)
+        + ", PARTITION pmax VALUES LESS THAN MAXVALUE)"
+    )
+    return len(definitions)
+
+
+def prepare_archive_table(cursor, table, archive_table):
+    """
+    Make sure an unpartitioned archive table exists. Returns True if it is
+    empty, i.e. a partition can be exchanged into it. Safe to rerun after an
+    interrupted maintain().
+    """
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS `{archive_table}` LIKE `{table}`")
+    if fetch_partitions(cursor, archive_table):
+        cursor.execute(f"ALTER TABLE `{archive_table}` REMOVE PARTITIONING")
+    cursor.execute(f"SELECT 1 FROM `{archive_table}` LIMIT 1")
+    return cursor.fetchone() is None
+
+
+def archive_old_partitions(cursor, table, partitions):
+    """
+    Detach partitions older than ARCHIVE_AFTER_MONTHS. Returns the names of
+    archive tables created.
+    """
+    months = ARCHIVE_AFTER_MONTHS.get(table)
+    if months is None:
+        return []
+
+    cutoff = add_months(date.today().replace(day=1), -months)
+    # Always keep at least one monthly partition besides pmax
+    candidates = [
+        name for name in partitions[:-2] if month_of(name) and month_of(name) < cutoff
+    ]
+
+    archived = []
+    for name in candidates:
+        cursor.execute(f"SELECT 1 FROM `{table}` PARTITION ({name}) LIMIT 1")
+        if cursor.fetchone():
+            archive_table = f"{table}_{name.upper()}"
+            if prepare_archive_table(cursor, table, archive_table):
+                cursor.execute(
+                    f"ALTER TABLE `{table}` EXCHANGE PARTITION {name}"
+                    f" WITH TABLE `{archive_table}`"
+                )
+            else:
+                # Already holds rows (a run stopped after the exchange): append
+                cursor.execute(
+                    f"INSERT INTO `{archive_table}`"
+                    f" SELECT * FROM `{table}` PARTITION ({name})"
+                )
+            archived.append(archive_table)
+            print(f"[INFO] {table}.{name} moved to {archive_table}")
+        cursor.execute(f"ALTER TABLE `{table}` DROP PARTITION {name}")
+    return archived
+
+
+def check_integrity(cursor):
+    """
+    Count rows referencing a missing parent, per dropped foreign key.
+    Returns {"TABLE.column": count} for the keys that have orphans.
+    """
+    orphans = {}
+    for table, column, parent, parent_column in DROPPED_FOREIGN_KEYS:
+        cursor.execute(
+            f"""
+            SELECT COUNT(*)
+            FROM `{table}` t
+            LEFT JOIN `{parent}` p ON t.`{column}` = p.`{parent_column}`
+            WHERE t.`{column}` IS NOT NULL AND p.`{parent_column}` IS NULL
+        """
+        )
+        count = cursor.fetchone()[0]
+        if count:
+            orphans[f"{table}.{column}"] = count
+            print(f"[!] {count} {table} rows reference a missing {parent}")
+    if not orphans:
+        print("[OK] No orphaned rows")
+    return orphans
+
+
+def maintain(cnx, cursor):
+    """
+    Add upcoming partitions and archive expired ones on partitioned tables,
+    then check the foreign keys dropped for partitioning
+    """
+    summary = {}
+    for table in PARTITIONED_TABLES:
+        partitions = fetch_partitions(cursor, table)
+        if not partitions:
+            continue
+        added = add_future_partitions(cursor, table, partitions)
+        archived = archive_old_partitions(
+            cursor, table, fetch_partitions(cursor, table)
+        )
+        summary[table] = {"added": added, "archived": archived}
+        print(f"[OK] {table}: {added} partitions added, {len(archived)} archived")
+    cnx.commit()
+    if summary:
+        summary["orphans"] = check_integrity(cursor)
+    return summary
+
+
+def status(cursor):
+    cursor.execute(
+        """
+        SELECT TABLE_NAME, PARTITION_NAME, TABLE_ROWS
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ("""
+        + ",".join(["%s"] * len(PARTITIONED_TABLES))
+        + """)
+        ORDER BY TABLE_NAME, PARTITION_ORDINAL_POSITION
+    """,
+        tuple(PARTITIONED_TABLES),
+    )
+    for table, name, rows in cursor.fetchall():
+        print(f"{table:<10} {name or '(not partitioned)':<18} ~{rows} rows")
+
+
+def main():
+    """Connect to the database and run the requested command"""
+    args = sys.argv[1:]
+    command = args[0] if args else "status"
+    if command not in ["migrate", "maintain", "check", "status"]:
+        print(__doc__)
+        return
+
+    cnx = None
+    cursor = None
+    try:
+        cnx = mysql.connector.connect(
+            host=DB_HOST,
+            user=DB_USER,
+            password=DB_PASS,
+            port=int(DB_PORT),
+            database=DB_NAME,
+        )
+        cursor = cnx.cursor()
+
+        if command == "migrate":
+            drop_foreign_keys = "--drop-foreign-keys" in args
+            for table in PARTITIONED_TABLES:
+                migrate_table(cursor, table, drop_foreign_keys)
+            cnx.commit()
+        elif command == "maintain":
+            maintain(cnx, cursor)
+        elif command == "check":
+            check_integrity(cursor)
+        else:
+            status(cursor)
+
+    except mysql.connector.Error as err:
+        print(f"[X] Database error: {err}")
+        if cnx:
+            cnx.rollback()
+    finally:
+        if cursor:
+            cursor.close()
+        if cnx:
+            cnx.close()
+
+
+if __name__ == "__main__":
+    main()
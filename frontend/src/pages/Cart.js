@@ -18,8 +18,8 @@ const Cart = () => {
 
     const loadCart = async () => {
       try {
-        const items = await api.getCart(user.customer_id);
-        setCartItems(items);
+        const cart = await api.getCart(user.customer_id);
+        setCartItems(cart.items);
       } catch (error) {
         console.error('Failed to load cart:', error);
       } finally {
@@ -46,14 +46,19 @@ const Cart = () => {
     }
 
     try {
-      // Remove and re-add with new quantity
-      await api.removeFromCart(user.customer_id, productId);
-      await api.addToCart(user.customer_id, productId, newQuantity);
-      
+      await api.updateCartBulk(user.customer_id, [
+        { product_id: productId, quantity: newQuantity, op: 'set' },
+      ]);
+
       setCartItems(items =>
         items.map(item =>
           item.product_id === productId
-            ? { ...item, quantity: newQuantity }
+            ? {
+                ...item,
+                quantity: newQuantity,
+                line_total: parseFloat(item.price) * newQuantity,
+                in_stock: newQuantity <= item.branch_stock,
+              }
             : item
         )
       );
@@ -64,10 +69,12 @@ const Cart = () => {
 
   const calculateTotal = () => {
     return cartItems.reduce((total, item) => {
-      return total + parseFloat(item.price) * item.quantity;
+      return total + item.line_total;
     }, 0);
   };
 
+  const allInStock = cartItems.every(item => item.in_stock);
+
   const handleCheckout = () => {
     navigate('/checkout', { state: { cartItems } });
   };
@@ -112,6 +119,13 @@ const Cart = () => {
                     <h3>{item.product_name}</h3>
                     <p className="cart-item-type">{item.product_type.toUpperCase()}</p>
                     <div className="cart-item-price">${parseFloat(item.price).toFixed(2)}</div>
+                    {!item.in_stock && (
+                      <p className="cart-item-stock">
+                        {item.branch_stock > 0
+                          ? `ONLY ${item.branch_stock} LEFT IN STOCK`
+                          : 'OUT OF STOCK'}
+                      </p>
+                    )}
                   </div>
                   <div className="cart-item-controls">
                     <div className="quantity-controls">
@@ -130,7 +144,7 @@ const Cart = () => {
                       </button>
                     </div>
                     <div className="cart-item-total">
-                      ${(parseFloat(item.price) * item.quantity).toFixed(2)}
+                      ${item.line_total.toFixed(2)}
                     </div>
                     <button
                       className="remove-btn"
@@ -160,8 +174,9 @@ const Cart = () => {
               <button 
                 className="checkout-btn"
                 onClick={handleCheckout}
+                disabled={!allInStock}
               >
-                Proceed to Checkout
+                {allInStock ? 'Proceed to Checkout' : 'Adjust Out of Stock Items'}
               </button>
             </div>
           </div>
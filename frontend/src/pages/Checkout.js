@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate, useLocation } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
 import api from '../services/api';
@@ -8,7 +8,7 @@ const Checkout = () => {
   const navigate = useNavigate();
   const location = useLocation();
   const { user } = useAuth();
-  const cartItems = location.state?.cartItems || [];
+  const [cartItems, setCartItems] = useState(location.state?.cartItems || []);
 
   const [formData, setFormData] = useState({
     delivery_address: '',
@@ -21,13 +21,47 @@ const Checkout = () => {
   const [savedAddresses, setSavedAddresses] = useState([]);
   const [selectedDeliveryId, setSelectedDeliveryId] = useState('new');
   const [selectedBillingId, setSelectedBillingId] = useState('new');
+  const [reservation, setReservation] = useState(null);
+  // One key per checkout visit: retries of the same submission never create a second order
+  const idempotencyKey = useRef(
+    window.crypto?.randomUUID ? window.crypto.randomUUID() : `${Date.now()}-${Math.random()}`
+  );
 
   useEffect(() => {
     if (user) {
       fetchSavedAddresses();
+      reserveStock();
     }
+    return () => {
+      // Leaving checkout gives the held stock back to other shoppers
+      if (user) {
+        api.releaseReservation(user.customer_id).catch(() => {});
+      }
+    };
   }, [user]);
 
+  const reserveStock = async () => {
+    try {
+      const data = await api.reserveCart(user.customer_id);
+      setReservation(data);
+    } catch (error) {
+      setReservation(null);
+      console.error('Failed to reserve stock:', error);
+    } finally {
+      refreshCart();
+    }
+  };
+
+  // Re-read prices and stock so the order is only submitted when it can succeed
+  const refreshCart = async () => {
+    try {
+      const cart = await api.getCart(user.customer_id);
+      setCartItems(cart.items);
+    } catch (error) {
+      console.error('Failed to refresh cart:', error);
+    }
+  };
+
   const fetchSavedAddresses = async () => {
     try {
       const data = await api.getProfile(user.customer_id);
@@ -70,12 +104,18 @@ const Checkout = () => {
 
   const calculateTotal = () => {
     return cartItems.reduce((total, item) => {
-      return total + parseFloat(item.price) * item.quantity;
+      return total + item.line_total;
     }, 0) + 10; // + shipping
   };
 
+  const unavailableItems = cartItems.filter(item => !item.in_stock);
+
   const handleSubmit = async (e) => {
     e.preventDefault();
+    if (unavailableItems.length > 0) {
+      alert('Some items are no longer in stock. Please update your cart.');
+      return;
+    }
     setLoading(true);
 
     try {
@@ -92,12 +132,13 @@ const Checkout = () => {
         ...formData,
       };
 
-      await api.createOrder(orderData);
+      await api.createOrder(orderData, idempotencyKey.current);
       alert('Order placed successfully!');
       navigate('/orders');
     } catch (error) {
       if (error.message.includes('Out of Stock')) {
         alert('ORDER FAILED: ' + error.message);
+        refreshCart();
       } else {
         alert('Failed to place order: ' + error.message);
       }
@@ -267,7 +308,7 @@ const Checkout = () => {
             <button
               type="submit"
               className="place-order-btn"
-              disabled={loading}
+              disabled={loading || unavailableItems.length > 0}
             >
               {loading ? 'Placing Order...' : 'Place Order'}
             </button>
@@ -281,9 +322,14 @@ const Checkout = () => {
                   <div className="summary-item-info">
                     <h4>{item.product_name}</h4>
                     <p>Quantity: {item.quantity}</p>
+                    {!item.in_stock && (
+                      <p className="summary-item-stock">
+                        Only {item.branch_stock} available
+                      </p>
+                    )}
                   </div>
                   <div className="summary-item-price">
-                    ${(parseFloat(item.price) * item.quantity).toFixed(2)}
+                    ${item.line_total.toFixed(2)}
                   </div>
                 </div>
               ))}
@@ -306,6 +352,12 @@ const Checkout = () => {
               <span>🔒</span>
               <span>Secure checkout</span>
             </div>
+            {reservation && (
+              <div className="secure-note">
+                <span>⏳</span>
+                <span>Your items are held for {Math.round(reservation.ttl_seconds / 60)} minutes</span>
+              </div>
+            )}
           </div>
         </div>
       </div>
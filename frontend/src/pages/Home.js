@@ -8,18 +8,20 @@ import './ErrorDisplay.css';
 const Home = () => {
   const [featuredGames, setFeaturedGames] = useState([]);
   const [featuredConsoles, setFeaturedConsoles] = useState([]);
+  const [bestSellers, setBestSellers] = useState([]);
+  const [topRated, setTopRated] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
   useEffect(() => {
     const loadProducts = async () => {
       try {
-        const [gamesResponse, consolesResponse] = await Promise.all([
-          api.getProducts({ type: 'game', limit: 6 }),
-          api.getProducts({ type: 'console', limit: 3 })
-        ]);
-        setFeaturedGames(gamesResponse.products);
-        setFeaturedConsoles(consolesResponse.products);
+        // Every section comes from one cached server-side document
+        const { sections } = await api.getHome();
+        setFeaturedGames(sections.new_releases);
+        setTopRated(sections.top_rated);
+        setFeaturedConsoles(sections.consoles);
+        setBestSellers(sections.best_sellers);
         setError(null);
       } catch (error) {
         console.error('Failed to load products:', error);
@@ -97,6 +99,26 @@ const Home = () => {
         </div>
       </section>
 
+      {/* Best Sellers Section */}
+      {bestSellers.length > 0 && (
+        <section className="featured-section">
+          <div className="container">
+            <div className="section-header">
+              <h2 className="section-title">Best Sellers This Week</h2>
+              <p className="section-description">
+                What everyone is playing right now, updated with every order.
+              </p>
+            </div>
+
+            <div className="products-grid">
+              {bestSellers.map(product => (
+                <ProductCard key={product.product_id} product={product} />
+              ))}
+            </div>
+          </div>
+        </section>
+      )}
+
       {/* Featured Games Section */}
       <section className="featured-section">
         <div className="container">
@@ -122,6 +144,32 @@ const Home = () => {
         </div>
       </section>
 
+      {/* Top Rated Section */}
+      {topRated.length > 0 && (
+        <section className="featured-section">
+          <div className="container">
+            <div className="section-header">
+              <h2 className="section-title">Top Rated</h2>
+              <p className="section-description">
+                The games our players rate the highest.
+              </p>
+            </div>
+
+            <div className="products-grid">
+              {topRated.map(product => (
+                <ProductCard key={product.product_id} product={product} />
+              ))}
+            </div>
+
+            <div className="section-footer">
+              <Link to="/products?type=game&sort_by=rating_desc" className="view-all-btn">
+                See All Top Rated →
+              </Link>
+            </div>
+          </div>
+        </section>
+      )}
+
       {/* Features Section */}
       <section className="features-section">
         <div className="container">
@@ -10,6 +10,18 @@ const Orders = () => {
   const [orders, setOrders] = useState([]);
   const [loading, setLoading] = useState(true);
   const [expandedOrderId, setExpandedOrderId] = useState(null);
+  const [statusFilter, setStatusFilter] = useState('');
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  const loadOrders = async (status, cursor = null) => {
+    const params = {};
+    if (status) params.status = status;
+    if (cursor) params.cursor = cursor;
+    const data = await api.getOrders(user.customer_id, params);
+    setOrders(prev => (cursor ? [...prev, ...data.orders] : data.orders));
+    setNextCursor(data.next_cursor);
+  };
 
   useEffect(() => {
     if (!user) {
@@ -17,24 +29,40 @@ const Orders = () => {
       return;
     }
 
-    const loadOrders = async () => {
-      try {
-        const data = await api.getOrders(user.customer_id);
-        setOrders(data);
-      } catch (error) {
-        console.error('Failed to load orders:', error);
-      } finally {
-        setLoading(false);
-      }
-    };
+    loadOrders(statusFilter)
+      .catch(error => console.error('Failed to load orders:', error))
+      .finally(() => setLoading(false));
+  }, [user, navigate, statusFilter]);
 
-    loadOrders();
-  }, [user, navigate]);
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    try {
+      await loadOrders(statusFilter, nextCursor);
+    } catch (error) {
+      console.error('Failed to load orders:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   const toggleOrder = (orderId) => {
     setExpandedOrderId(expandedOrderId === orderId ? null : orderId);
   };
 
+  const handleBuyAgain = async (order) => {
+    const items = (order.items || [])
+      .filter(item => item.product_id)
+      .map(item => ({ product_id: item.product_id, quantity: item.quantity, op: 'increment' }));
+    if (items.length === 0) return;
+
+    try {
+      await api.updateCartBulk(user.customer_id, items);
+      navigate('/cart');
+    } catch (error) {
+      alert("Failed to add items to cart: " + (error.response?.data?.error || error.message));
+    }
+  };
+
   if (loading) {
     return <div className="loading">LOADING...</div>;
   }
@@ -44,9 +72,21 @@ const Orders = () => {
       <div className="container">
         <h1 className="page-title">📦 YOUR ORDERS</h1>
 
+        <div className="orders-filter">
+          <select className="pixel-input" value={statusFilter} onChange={(e) => setStatusFilter(e.target.value)}>
+            <option value="">ALL ORDERS</option>
+            <option value="pending">PENDING</option>
+            <option value="processing">PROCESSING</option>
+            <option value="shipped">SHIPPED</option>
+            <option value="delivered">DELIVERED</option>
+            <option value="cancelled">CANCELLED</option>
+            <option value="returned">RETURNED</option>
+          </select>
+        </div>
+
         {orders.length === 0 ? (
           <div className="empty-orders">
-            <p>YOU HAVE NO ORDERS YET</p>
+            <p>{statusFilter ? 'NO ORDERS WITH THIS STATUS' : 'YOU HAVE NO ORDERS YET'}</p>
             <button
               className="pixel-button"
               onClick={() => navigate('/products')}
@@ -134,8 +174,17 @@ const Orders = () => {
                       </div>
                     ))}
 
-                    {/* Full Order Return Button */}
-                    {order.order_status === 'delivered' && (
+                    <div className="return-order-section">
+                      <button
+                        className="pixel-button"
+                        onClick={() => handleBuyAgain(order)}
+                      >
+                        BUY AGAIN
+                      </button>
+                    </div>
+
+                    {/* Full Order Return Button (archived orders are read-only) */}
+                    {order.order_status === 'delivered' && !order.archived && (
                       <div className="return-order-section">
                         <button
                           className="pixel-button return-btn"
@@ -146,8 +195,7 @@ const Orders = () => {
                                 await api.requestReturn(order.order_id, reason);
                                 alert("Return requested for the entire order!");
                                 // Refresh orders
-                                const data = await api.getOrders(user.customer_id);
-                                setOrders(data);
+                                await loadOrders(statusFilter);
                               } catch (error) {
                                 alert("Failed to request return: " + (error.response?.data?.error || error.message));
                               }
@@ -162,6 +210,15 @@ const Orders = () => {
                 )}
               </div>
             ))}
+            {nextCursor && (
+              <button
+                className="pixel-button"
+                onClick={handleLoadMore}
+                disabled={loadingMore}
+              >
+                {loadingMore ? 'LOADING...' : 'LOAD MORE ORDERS'}
+              </button>
+            )}
           </div>
         )}
       </div>
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate, Link } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
 import api from '../services/api';
+import ProductCard from '../components/ProductCard';
 import './ProductDetail.css';
 
 const ProductDetail = () => {
@@ -19,12 +20,20 @@ const ProductDetail = () => {
   });
   const [lightboxIndex, setLightboxIndex] = useState(null);
   const [hoverRating, setHoverRating] = useState(0);
+  const [reviews, setReviews] = useState([]);
+  const [reviewsCursor, setReviewsCursor] = useState(null);
+  const [reviewSort, setReviewSort] = useState('newest');
+  const [loadingReviews, setLoadingReviews] = useState(false);
+  const [relatedProducts, setRelatedProducts] = useState([]);
 
   useEffect(() => {
     const loadProduct = async () => {
       try {
         const data = await api.getProduct(productId);
         setProduct(data);
+        setReviews(data.reviews || []);
+        setReviewsCursor(data.reviews_next_cursor);
+        setReviewSort('newest');
       } catch (error) {
         console.error('Failed to load product:', error);
         alert('Product not found');
@@ -37,6 +46,12 @@ const ProductDetail = () => {
     loadProduct();
   }, [productId, navigate]);
 
+  useEffect(() => {
+    api.getRelatedProducts(productId)
+      .then(data => setRelatedProducts(data.related))
+      .catch(error => console.error('Failed to load related products:', error));
+  }, [productId]);
+
   useEffect(() => {
     const checkEligibility = async () => {
       if (user && product) {
@@ -81,12 +96,35 @@ const ProductDetail = () => {
       // Reload product to show new review
       const data = await api.getProduct(productId);
       setProduct(data);
+      setReviews(data.reviews || []);
+      setReviewsCursor(data.reviews_next_cursor);
+      setReviewSort('newest');
       setReviewForm({ rating: 5, review_title: '', review_text: '' });
     } catch (error) {
       alert('Failed to submit review: ' + error.message);
     }
   };
 
+  const loadReviews = async (sort, cursor = null) => {
+    setLoadingReviews(true);
+    try {
+      const params = { sort };
+      if (cursor) params.cursor = cursor;
+      const data = await api.getProductReviews(productId, params);
+      setReviews(prev => (cursor ? [...prev, ...data.reviews] : data.reviews));
+      setReviewsCursor(data.next_cursor);
+    } catch (error) {
+      console.error('Failed to load reviews:', error);
+    } finally {
+      setLoadingReviews(false);
+    }
+  };
+
+  const handleReviewSortChange = (e) => {
+    setReviewSort(e.target.value);
+    loadReviews(e.target.value);
+  };
+
   const handleAddToCart = async () => {
     if (!user) {
       alert('Please login to add items to cart');
@@ -265,13 +303,13 @@ const ProductDetail = () => {
                 )}
 
                 {/* Average Rating Display */}
-                {product.reviews && product.reviews.length > 0 && (
+                {product.review_summary && product.review_summary.review_count > 0 && (
                   <div className="spec-item">
                     <span className="spec-label">AVERAGE RATING:</span>
                     <span className="spec-value" style={{ color: '#ffd700' }}>
-                      ★ {(product.reviews.reduce((a, b) => a + b.rating, 0) / product.reviews.length).toFixed(1)} / 5
+                      ★ {Number(product.review_summary.avg_rating).toFixed(1)} / 5
                       <span style={{ color: '#aaa', fontSize: '11px', marginLeft: '8px', fontWeight: 'normal' }}>
-                        (Based on {product.reviews.length} reviews)
+                        (Based on {product.review_summary.review_count} reviews)
                       </span>
                     </span>
                   </div>
@@ -395,9 +433,24 @@ const ProductDetail = () => {
           </div>
         </div>
 
+        {relatedProducts.length > 0 && (
+          <div className="related-products-section">
+            <h3>
+              {relatedProducts.every(related => related.source === 'copurchase')
+                ? 'CUSTOMERS ALSO BOUGHT'
+                : 'YOU MIGHT ALSO LIKE'}
+            </h3>
+            <div className="related-products-grid">
+              {relatedProducts.map(related => (
+                <ProductCard key={related.product_id} product={related} />
+              ))}
+            </div>
+          </div>
+        )}
+
         {/* Review Section - Moved outside grid */}
         <div className="product-reviews-section">
-          <h3>REVIEWS ({product.reviews?.length || 0})</h3>
+          <h3>REVIEWS ({product.review_summary?.review_count || 0})</h3>
 
           {user && canReview ? (
             <form onSubmit={handleReviewSubmit} className="review-form">
@@ -452,9 +505,17 @@ const ProductDetail = () => {
             )
           )}
 
-          {product.reviews && product.reviews.length > 0 ? (
+          {reviews.length > 0 ? (
             <div className="reviews-list">
-              {product.reviews.map(review => (
+              <div className="reviews-sort">
+                <label>SORT BY: </label>
+                <select className="pixel-input" value={reviewSort} onChange={handleReviewSortChange}>
+                  <option value="newest">Newest</option>
+                  <option value="helpful">Most Helpful</option>
+                  <option value="rating">Highest Rating</option>
+                </select>
+              </div>
+              {reviews.map(review => (
                 <div key={review.review_id} className="review-item">
                   <div className="review-header">
                     <span className="review-author">
@@ -475,6 +536,15 @@ const ProductDetail = () => {
                   )}
                 </div>
               ))}
+              {reviewsCursor && (
+                <button
+                  className="pixel-button"
+                  onClick={() => loadReviews(reviewSort, reviewsCursor)}
+                  disabled={loadingReviews}
+                >
+                  {loadingReviews ? 'LOADING...' : 'LOAD MORE REVIEWS'}
+                </button>
+              )}
             </div>
           ) : (
             <div className="no-reviews">
@@ -33,6 +33,8 @@ const Products = () => {
     page: parseInt(searchParams.get('page')) || 1
   });
   const [totalPages, setTotalPages] = useState(1);
+  const [suggestions, setSuggestions] = useState([]);
+  const [fuzzyMatch, setFuzzyMatch] = useState(false);
 
   // Sync filters to URL
   useEffect(() => {
@@ -49,11 +51,17 @@ const Products = () => {
     const loadData = async () => {
       setLoading(true);
       try {
-        const [productsResponse, genresData, platformsData] = await Promise.all([
+        let [productsResponse, genresData, platformsData] = await Promise.all([
           api.getProducts(filters),
           api.getGenres(),
           api.getPlatforms()
         ]);
+        // Nothing matched exactly: retry with typo-tolerant search
+        const useFuzzy = filters.search && productsResponse.total_count === 0;
+        if (useFuzzy) {
+          productsResponse = await api.getProducts({ ...filters, fuzzy: true, sort_by: 'relevance' });
+        }
+        setFuzzyMatch(useFuzzy && productsResponse.total_count > 0);
         setProducts(productsResponse.products);
         setTotalPages(productsResponse.total_pages);
         setGenres(genresData);
@@ -74,6 +82,23 @@ const Products = () => {
     return () => clearTimeout(timer);
   }, [filters]);
 
+  // Typeahead suggestions are served from memory, so fetch on every keystroke
+  useEffect(() => {
+    if (!filters.search) {
+      setSuggestions([]);
+      return;
+    }
+    let cancelled = false;
+    api.getSearchSuggestions(filters.search)
+      .then(data => {
+        if (!cancelled) setSuggestions(data.suggestions);
+      })
+      .catch(() => {});
+    return () => {
+      cancelled = true;
+    };
+  }, [filters.search]);
+
   const handleFilterChange = (key, value) => {
     setFilters(prev => ({ ...prev, [key]: value, page: 1 }));
     setError(null);
@@ -183,7 +208,14 @@ const Products = () => {
               placeholder="Search products..."
               value={filters.search}
               onChange={(e) => handleFilterChange('search', e.target.value)}
+              list="search-suggestions"
+              autoComplete="off"
             />
+            <datalist id="search-suggestions">
+              {suggestions.map(suggestion => (
+                <option key={`${suggestion.type}-${suggestion.text}`} value={suggestion.text} />
+              ))}
+            </datalist>
           </div>
 
           {/* TYPE FILTER */}
@@ -446,6 +478,11 @@ const Products = () => {
           </div>
         ) : (
           <>
+            {fuzzyMatch && (
+              <p className="fuzzy-notice">
+                No exact matches for "{filters.search}". Showing similar titles.
+              </p>
+            )}
             {products.length > 0 ? (
               viewMode === 'grid' ? (
                 <div className="products-grid">
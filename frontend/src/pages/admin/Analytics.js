@@ -2,16 +2,33 @@ import React, { useState, useEffect } from 'react';
 import api from '../../services/api';
 import './Analytics.css'; // New CSS file
 
+// Reporting periods in days (null = all time). A bounded period lets the
+// database scan only the monthly partitions it covers.
+const PERIODS = [
+    { key: '30d', label: 'LAST 30 DAYS', days: 30 },
+    { key: '12m', label: 'LAST 12 MONTHS', days: 365 },
+    { key: 'all', label: 'ALL TIME', days: null }
+];
+
 const Analytics = () => {
     const [data, setData] = useState(null);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
+    const [period, setPeriod] = useState('12m');
 
     useEffect(() => {
         const fetchAnalytics = async () => {
             try {
-                const response = await api.getAdminAnalytics();
+                const { days } = PERIODS.find(p => p.key === period);
+                const params = {};
+                if (days) {
+                    const from = new Date();
+                    from.setDate(from.getDate() - days);
+                    params.from = from.toISOString().slice(0, 10);
+                }
+                const response = await api.getAdminAnalytics(params);
                 setData(response);
+                setError(null);
             } catch (err) {
                 setError('Failed to load analytics data');
                 console.error(err);
@@ -21,7 +38,7 @@ const Analytics = () => {
         };
 
         fetchAnalytics();
-    }, []);
+    }, [period]);
 
     if (loading) return <div className="loading">LOADING ANALYTICS...</div>;
     if (error) return <div className="error-message">{error}</div>;
@@ -31,6 +48,16 @@ const Analytics = () => {
         <div className="analytics-dashboard">
             <div className="admin-page-header">
                 <h1 className="admin-title">EXECUTIVE DASHBOARD</h1>
+                <select
+                    value={period}
+                    onChange={(e) => setPeriod(e.target.value)}
+                    className="pixel-input"
+                    style={{ padding: '8px', background: '#1a1a2e', color: '#fff', border: '2px solid #4a90e2' }}
+                >
+                    {PERIODS.map(p => (
+                        <option key={p.key} value={p.key}>{p.label}</option>
+                    ))}
+                </select>
             </div>
 
             {/* KPI Cards */}
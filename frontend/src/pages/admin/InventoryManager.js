@@ -86,17 +86,23 @@ const InventoryManager = () => {
 
     const [showHistory, setShowHistory] = useState(false);
     const [stockLogs, setStockLogs] = useState([]);
+    const [stockLogsCursor, setStockLogsCursor] = useState(null);
 
-    const fetchStockLogs = async () => {
+    // History follows the branch picked in the header
+    const stockLogFilters = selectedBranch ? { branch_id: selectedBranch } : {};
+
+    const fetchStockLogs = async (cursor = null) => {
         try {
-            const response = await api.getAdminStockLogs();
-            console.log("API Response:", response);
+            const params = { ...stockLogFilters, limit: 50 };
+            if (cursor) params.cursor = cursor;
+            const response = await api.getAdminStockLogs(params);
 
             // Safe extraction logic
             const logsData = response.logs || response;
 
             if (Array.isArray(logsData)) {
-                setStockLogs(logsData);
+                setStockLogs(prev => (cursor ? [...prev, ...logsData] : logsData));
+                setStockLogsCursor(response.next_cursor || null);
                 setShowHistory(true);
             } else {
                 console.error("Data format error. Received:", response);
@@ -133,7 +139,9 @@ const InventoryManager = () => {
 
     const handleOpenRestock = async (item) => {
         setSelectedItem(item);
-        setRestockForm({ mode: 'supplier', supplierId: '', fromBranchId: '', quantity: 10, unitCost: 0 });
+        // Default to the forecast's suggested order when the row needs one
+        const quantity = item.suggested_order_qty > 0 ? item.suggested_order_qty : 10;
+        setRestockForm({ mode: 'supplier', supplierId: '', fromBranchId: '', quantity, unitCost: 0 });
         setShowRestockModal(true);
 
         try {
@@ -187,7 +195,7 @@ const InventoryManager = () => {
 
             setShowRestockModal(false);
             fetchInventory(); // Refresh table
-            fetchStockLogs(); // Refresh logs if open
+            if (showHistory) fetchStockLogs(); // Refresh logs if open
         } catch (error) {
             console.error('Operation failed:', error);
             alert('Operation failed: ' + (error.response?.data?.error || error.message));
@@ -196,6 +204,44 @@ const InventoryManager = () => {
         }
     };
 
+    // CSV columns: product_id, branch_id, supplier_id, quantity, unit_cost
+    const handleImportRestock = async (e) => {
+        const file = e.target.files[0];
+        e.target.value = '';
+        if (!file) return;
+
+        const invoiceNo = prompt('Purchase order / invoice number (optional):');
+        try {
+            const result = await api.bulkRestockCsv(file, invoiceNo);
+            alert(`Imported ${result.purchases} lines into ${result.inventory_rows} inventory rows.`);
+            fetchInventory();
+            if (showHistory) fetchStockLogs();
+        } catch (error) {
+            console.error('Import failed:', error);
+            alert('Import failed: ' + error.message);
+        }
+    };
+
+    // Move stock between branches so each stays within its min/max levels
+    const handleRebalance = async () => {
+        try {
+            const plan = await api.getRebalancePlan();
+            if (!plan.moves) {
+                alert('All branches are already within their stock levels.');
+                return;
+            }
+            if (!window.confirm(`Move ${plan.units} units in ${plan.moves} transfers?`)) return;
+
+            const result = await api.bulkTransferInventory(plan.transfers);
+            alert(`Rebalanced: ${result.units} units moved in ${result.transfers} transfers.`);
+            fetchInventory();
+            if (showHistory) fetchStockLogs();
+        } catch (error) {
+            console.error('Rebalance failed:', error);
+            alert('Rebalance failed: ' + error.message);
+        }
+    };
+
     if (loading && !inventory.length) return <div className="loading">LOADING...</div>;
 
     return (
@@ -216,10 +262,25 @@ const InventoryManager = () => {
                     </select>
                     <button
                         className="pixel-button"
-                        onClick={fetchStockLogs}
+                        onClick={() => fetchStockLogs()}
                     >
                         VIEW HISTORY (LOGS)
                     </button>
+                    <button
+                        className="pixel-button"
+                        onClick={handleRebalance}
+                    >
+                        REBALANCE BRANCHES
+                    </button>
+                    <label className="pixel-button" style={{ cursor: 'pointer' }}>
+                        IMPORT PURCHASE ORDER (CSV)
+                        <input
+                            type="file"
+                            accept=".csv,text/csv"
+                            onChange={handleImportRestock}
+                            style={{ display: 'none' }}
+                        />
+                    </label>
                 </div>
             </div>
 
@@ -432,6 +493,23 @@ const InventoryManager = () => {
                                     )}
                                 </tbody>
                             </table>
+                            <div style={{ display: 'flex', justifyContent: 'space-between', marginTop: '15px' }}>
+                                <a
+                                    className="pixel-button"
+                                    href={api.getStockLogsExportUrl(stockLogFilters)}
+                                    download
+                                >
+                                    EXPORT CSV
+                                </a>
+                                {stockLogsCursor && (
+                                    <button
+                                        className="pixel-button"
+                                        onClick={() => fetchStockLogs(stockLogsCursor)}
+                                    >
+                                        LOAD MORE
+                                    </button>
+                                )}
+                            </div>
                         </div>
                     </div>
                 </div>
@@ -450,6 +528,10 @@ const InventoryManager = () => {
                             <th onClick={() => handleSort('quantity')} style={{ cursor: 'pointer' }}>
                                 QUANTITY {getSortIcon('quantity')}
                             </th>
+                            <th title="Forecast reorder point (static alert level when there is no forecast)">
+                                REORDER AT
+                            </th>
+                            <th>SUGGESTED ORDER</th>
                             <th onClick={() => handleSort('last_update')} style={{ cursor: 'pointer' }}>
                                 LAST UPDATE {getSortIcon('last_update')}
                             </th>
@@ -458,15 +540,19 @@ const InventoryManager = () => {
                     </thead>
                     <tbody>
                         {filteredInventory.map((item) => (
-                            <tr key={`${item.product_id}-${item.branch_name}`} className={item.quantity <= item.stock_alert_level ? 'low-stock' : ''}>
+                            <tr key={`${item.product_id}-${item.branch_name}`} className={item.quantity <= item.reorder_point ? 'low-stock' : ''}>
                                 <td>
                                     {item.product_name}
-                                    {item.quantity <= item.stock_alert_level && (
+                                    {item.quantity <= item.reorder_point && (
                                         <span className="low-stock-badge">LOW STOCK</span>
                                     )}
                                 </td>
                                 <td>{item.branch_name}</td>
                                 <td>{item.quantity}</td>
+                                <td title={item.daily_demand != null ? `~${Number(item.daily_demand).toFixed(1)}/day` : ''}>
+                                    {item.reorder_point}
+                                </td>
+                                <td>{item.suggested_order_qty > 0 ? item.suggested_order_qty : '-'}</td>
                                 <td>{new Date(item.last_update_date).toLocaleDateString()}</td>
                                 <td>
                                     <button
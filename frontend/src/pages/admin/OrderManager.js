@@ -15,6 +15,10 @@ const OrderManager = () => {
         direction: 'desc'
     });
 
+    // Bulk Status State
+    const [selectedIds, setSelectedIds] = useState([]);
+    const [bulkStatus, setBulkStatus] = useState('shipped');
+
     // In-Store Sale State
     const [showSaleModal, setShowSaleModal] = useState(false);
     const [branches, setBranches] = useState([]);
@@ -111,6 +115,39 @@ const OrderManager = () => {
         }
     };
 
+    const toggleSelected = (orderId) => {
+        setSelectedIds(current =>
+            current.includes(orderId)
+                ? current.filter(id => id !== orderId)
+                : [...current, orderId]
+        );
+    };
+
+    const toggleSelectAll = () => {
+        const pageIds = orders.map(order => order.order_id);
+        const allSelected = pageIds.every(id => selectedIds.includes(id));
+        setSelectedIds(allSelected ? [] : pageIds);
+    };
+
+    const handleBulkStatusChange = async () => {
+        if (selectedIds.length === 0) return;
+        try {
+            const response = await api.bulkUpdateOrderStatus(selectedIds, bulkStatus);
+            const problems = response.results.filter(r => r.result !== 'updated' && r.result !== 'unchanged');
+            let message = `${response.updated} of ${selectedIds.length} orders updated.`;
+            if (problems.length > 0) {
+                message += '\n\nNot updated:\n' + problems
+                    .map(r => `#${r.order_id}: ${r.result.replace('_', ' ')}${r.from ? ` (from ${r.from})` : ''}`)
+                    .join('\n');
+            }
+            alert(message);
+            setSelectedIds([]);
+            loadOrders();
+        } catch (error) {
+            alert('Failed to update orders: ' + error.message);
+        }
+    };
+
     const handleSort = (key) => {
         setSortConfig(current => ({
             key,
@@ -154,9 +191,36 @@ const OrderManager = () => {
             </div>
 
             <div className="admin-card">
+                {selectedIds.length > 0 && (
+                    <div style={{ display: 'flex', alignItems: 'center', gap: '10px', marginBottom: '15px' }}>
+                        <span>{selectedIds.length} selected</span>
+                        <select
+                            className="pixel-input small"
+                            value={bulkStatus}
+                            onChange={(e) => setBulkStatus(e.target.value)}
+                            style={{ padding: '5px', background: '#0f172a', color: 'white', border: '1px solid #334155' }}
+                        >
+                            <option value="processing">Processing</option>
+                            <option value="shipped">Shipped</option>
+                            <option value="delivered">Delivered</option>
+                            <option value="cancelled">Cancelled</option>
+                            <option value="returned">Returned</option>
+                        </select>
+                        <button className="pixel-button" onClick={handleBulkStatusChange}>
+                            APPLY TO SELECTED
+                        </button>
+                    </div>
+                )}
                 <table className="admin-table">
                     <thead>
                         <tr>
+                            <th>
+                                <input
+                                    type="checkbox"
+                                    checked={orders.length > 0 && orders.every(order => selectedIds.includes(order.order_id))}
+                                    onChange={toggleSelectAll}
+                                />
+                            </th>
                             <th onClick={() => handleSort('id')} style={{ cursor: 'pointer' }}>
                                 ORDER ID {getSortIcon('id')}
                             </th>
@@ -178,6 +242,13 @@ const OrderManager = () => {
                     <tbody>
                         {orders.map((order) => (
                             <tr key={order.order_id}>
+                                <td>
+                                    <input
+                                        type="checkbox"
+                                        checked={selectedIds.includes(order.order_id)}
+                                        onChange={() => toggleSelected(order.order_id)}
+                                    />
+                                </td>
                                 <td>#{order.order_id}</td>
                                 <td>
                                     {order.customer_name}
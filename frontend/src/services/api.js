@@ -29,11 +29,18 @@ api.interceptors.response.use(
 );
 
 const apiService = {
+  // Home
+  getHome: () => api.get('/home'),
+
   // Products
   getProducts: (params = {}) => api.get('/products', { params }),
   getProduct: (productId) => api.get(`/products/${productId}`),
+  getRelatedProducts: (productId, limit = 6) => api.get(`/products/${productId}/related`, { params: { limit } }),
+  getProductReviews: (productId, params = {}) => api.get(`/products/${productId}/reviews`, { params }),
   getGenres: () => api.get('/genres'),
   getPlatforms: () => api.get('/platforms'),
+  getLeaderboard: (params = {}) => api.get('/leaderboards', { params }),
+  getSearchSuggestions: (query, limit = 8) => api.get('/search/suggest', { params: { q: query, limit } }),
 
   // Customers
   registerCustomer: (customerData) => api.post('/customers/register', customerData),
@@ -50,11 +57,19 @@ const apiService = {
   getCart: (customerId) => api.get(`/cart/${customerId}`),
   addToCart: (customerId, productId, quantity = 1) => api.post('/cart', { customer_id: customerId, product_id: productId, quantity }),
   removeFromCart: (customerId, productId) => api.delete(`/cart/${customerId}/${productId}`),
+  updateCartBulk: (customerId, items) => api.post('/cart/bulk', { customer_id: customerId, items }),
+
+  // Checkout reservations
+  reserveCart: (customerId) => api.post('/reservations', { customer_id: customerId }),
+  releaseReservation: (customerId) => api.delete(`/reservations/${customerId}`),
 
   // Orders
-  createOrder: (orderData) => api.post('/orders', orderData),
-  getOrders: (customerId) => api.get(`/orders/${customerId}`),
+  createOrder: (orderData, idempotencyKey) => api.post('/orders', orderData, {
+    headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {},
+  }),
+  getOrders: (customerId, params = {}) => api.get(`/orders/${customerId}`, { params }),
   updateOrderStatus: (orderId, status) => api.put(`/orders/${orderId}/status`, { status }),
+  bulkUpdateOrderStatus: (orderIds, status) => api.post('/admin/orders/status', { order_ids: orderIds, status }),
 
   // Reviews
   createReview: (reviewData) => api.post('/reviews', reviewData),
@@ -64,12 +79,22 @@ const apiService = {
   getAdminStats: () => api.get('/admin/stats'),
   getAdminInventory: (params = {}) => api.get('/admin/inventory', { params }),
   getAdminOrders: (params = {}) => api.get('/admin/orders', { params }),
-  getAdminStockLogs: (limit = 50) => api.get('/admin/stock-logs', { params: { limit } }),
-  getAdminAnalytics: () => api.get('/admin/analytics'),
+  getAdminStockLogs: (params = {}) => api.get('/admin/stock-logs', { params }),
+  getStockLogsExportUrl: (params = {}) =>
+    `${API_BASE_URL}/admin/stock-logs?${new URLSearchParams({ ...params, format: 'csv' })}`,
+  getAdminAnalytics: (params = {}) => api.get('/admin/analytics', { params }),
   getSuppliers: () => api.get('/admin/suppliers'),
   restockInventory: (data) => api.post('/admin/restock', data),
+  bulkRestockCsv: (file, invoiceNo) => {
+    const form = new FormData();
+    form.append('file', file);
+    if (invoiceNo) form.append('invoice_no', invoiceNo);
+    return api.post('/admin/restock/bulk', form);
+  },
   getBranches: (params = {}) => api.get('/admin/branches', { params }),
   transferInventory: (data) => api.post('/admin/inventory/transfer', data),
+  getRebalancePlan: (params = {}) => api.get('/admin/inventory/rebalance', { params }),
+  bulkTransferInventory: (transfers) => api.post('/admin/inventory/transfer/bulk', { transfers }),
   recordOfflineSale: (data) => api.post('/admin/sales/offline', data),
   getAdminReturns: (params = {}) => api.get('/admin/returns', { params }),
   requestReturn: (orderId, reason) => api.post('/returns/request', {
@@ -0,0 +1,15 @@
+"""
+Pytest setup: make app.py and the database/ builders importable.
+
+db_test.py and test_api_calls.py are manual scripts against the live IGDB
+API, so they are not collected.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "database"))
+
+collect_ignore = ["db_test.py", "test_api_calls.py"]
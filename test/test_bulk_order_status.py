@@ -0,0 +1,96 @@
+"""Tests for chunked bulk order status updates (no database needed)"""
+
+import mysql.connector
+import pytest
+
+import app
+
+
+class FakeConnection:
+    def __init__(self):
+        self.rollbacks = 0
+
+    def cursor(self, **kwargs):
+        return self
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+
+@pytest.fixture
+def client(monkeypatch):
+    connection = FakeConnection()
+    monkeypatch.setattr(app, "get_db_connection", lambda: connection)
+    monkeypatch.setattr(app, "schedule_outbox_drain", lambda: None)
+    monkeypatch.setattr(app, "lock_retry_delay", lambda attempt: 0)
+    monkeypatch.setattr(app, "ORDER_BULK_CHUNK", 2)
+    return app.app.test_client()
+
+
+def post(client, order_ids, status="shipped"):
+    return client.post(
+        "/api/admin/orders/status", json={"status": status, "order_ids": order_ids}
+    )
+
+
+def test_orders_are_processed_in_chunks_in_request_order(client, monkeypatch):
+    chunks = []
+
+    def apply_chunk(cnx, cursor, chunk, new_status):
+        chunks.append(list(chunk))
+        return {oid: {"order_id": oid, "result": "updated"} for oid in chunk}
+
+    monkeypatch.setattr(app, "apply_order_status_chunk", apply_chunk)
+    response = post(client, [5, "3", 5, 9, 1])
+
+    assert response.status_code == 200
+    assert chunks == [[5, 3], [9, 1]]
+    assert [r["order_id"] for r in response.json["results"]] == [5, 3, 9, 1]
+    assert response.json["updated"] == 4
+
+
+def test_failed_chunk_does_not_affect_other_chunks(client, monkeypatch):
+    def apply_chunk(cnx, cursor, chunk, new_status):
+        if 3 in chunk:
+            raise ValueError("boom")
+        return {oid: {"order_id": oid, "result": "updated"} for oid in chunk}
+
+    monkeypatch.setattr(app, "apply_order_status_chunk", apply_chunk)
+    results = post(client, [1, 2, 3, 4, 5]).json["results"]
+
+    assert [r["result"] for r in results] == [
+        "updated",
+        "updated",
+        "failed",
+        "failed",
+        "updated",
+    ]
+
+
+def test_deadlocked_chunk_is_retried(client, monkeypatch):
+    calls = []
+
+    def apply_chunk(cnx, cursor, chunk, new_status):
+        calls.append(list(chunk))
+        if len(calls) == 1:
+            raise mysql.connector.Error(msg="Deadlock found", errno=1213)
+        return {oid: {"order_id": oid, "result": "updated"} for oid in chunk}
+
+    monkeypatch.setattr(app, "apply_order_status_chunk", apply_chunk)
+    response = post(client, [1, 2])
+
+    assert calls == [[1, 2], [1, 2]]
+    assert response.json["updated"] == 2
+
+
+def test_invalid_order_ids_are_rejected(client):
+    response = post(client, [1, "x"])
+    assert response.status_code == 400
+    assert response.json["index"] == 1
+    assert post(client, [1], status="teleported").status_code == 400
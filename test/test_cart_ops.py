@@ -0,0 +1,128 @@
+"""Tests for bulk cart operations (no database needed)"""
+
+import pytest
+
+import app
+from app import collapse_cart_ops
+
+
+def test_increments_add_up():
+    ops = collapse_cart_ops(
+        [{"product_id": 1, "quantity": 2}, {"product_id": "1", "quantity": 3}]
+    )
+    assert ops == {1: ("increment", 5)}
+
+
+def test_set_then_increment_becomes_a_set():
+    ops = collapse_cart_ops(
+        [
+            {"product_id": 1, "op": "set", "quantity": 4},
+            {"product_id": 1, "quantity": 2},
+        ]
+    )
+    assert ops == {1: ("set", 6)}
+
+
+def test_remove_then_increment_starts_from_zero():
+    ops = collapse_cart_ops(
+        [{"product_id": 1, "op": "remove"}, {"product_id": 1, "quantity": 2}]
+    )
+    assert ops == {1: ("set", 2)}
+
+
+def test_last_set_wins_and_set_to_zero_removes():
+    ops = collapse_cart_ops(
+        [
+            {"product_id": 1, "quantity": 3},
+            {"product_id": 1, "op": "set", "quantity": 0},
+            {"product_id": 2, "op": "set", "quantity": 1},
+            {"product_id": 2, "op": "set", "quantity": 7},
+        ]
+    )
+    assert ops == {1: ("remove", 0), 2: ("set", 7)}
+
+
+class FakeConnection:
+    def __init__(self):
+        self.statements = []
+        self.committed = False
+
+    def cursor(self, **kwargs):
+        return self
+
+    def execute(self, query, params=()):
+        self.statements.append((" ".join(query.split()), params))
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    connection = FakeConnection()
+    monkeypatch.setattr(app, "get_db_connection", lambda: connection)
+    return connection
+
+
+def test_bulk_endpoint_writes_one_statement_per_operation_type(connection):
+    response = app.app.test_client().post(
+        "/api/cart/bulk",
+        json={
+            "customer_id": 7,
+            "items": [
+                {"product_id": 1, "quantity": 2},
+                {"product_id": 2, "op": "set", "quantity": 5},
+                {"product_id": 3, "op": "remove"},
+                {"product_id": 1, "quantity": 1},
+            ],
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json["removed"] == 1
+    assert response.json["set"] == 1
+    assert response.json["incremented"] == 1
+    assert connection.committed
+    delete, upsert_set, upsert_increment = connection.statements
+    assert delete[0].startswith("DELETE FROM CART") and delete[1] == (7, 3)
+    assert upsert_set[1] == (7, 2, 5)
+    assert upsert_increment[1] == (7, 1, 3)
+    assert "quantity = quantity + VALUES(quantity)" in upsert_increment[0]
+
+
+@pytest.mark.parametrize(
+    "items, index",
+    [
+        ([{"product_id": 1}, {"product_id": "abc"}], 1),
+        ([{"product_id": 1, "quantity": None}], 0),
+        ([{"product_id": 1, "op": "explode"}], 0),
+        ([{"product_id": 1, "quantity": -1}], 0),
+        (["not an object"], 0),
+    ],
+)
+def test_bulk_endpoint_rejects_malformed_items(connection, items, index):
+    response = app.app.test_client().post(
+        "/api/cart/bulk", json={"customer_id": 7, "items": items}
+    )
+    assert response.status_code == 400
+    assert response.json["index"] == index
+    assert connection.statements == []
+
+
+@pytest.mark.parametrize("body", [[], "x", 3])
+def test_bulk_endpoint_rejects_non_object_body(connection, body):
+    response = app.app.test_client().post("/api/cart/bulk", json=body)
+    assert response.status_code == 400
+    assert connection.statements == []
@@ -0,0 +1,73 @@
+"""Tests for the in-memory sliding-window leaderboard (app.SalesLeaderboard)"""
+
+import pytest
+
+import app
+from app import SalesLeaderboard
+
+NOW = 500000
+
+PRODUCTS = {
+    1: {"info": {"product_id": 1}, "segments": ["all", "type:game", "genre:RPG"]},
+    2: {"info": {"product_id": 2}, "segments": ["all", "type:game"]},
+    3: {"info": {"product_id": 3}, "segments": ["all", "type:console"]},
+}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    hour = {"now": NOW}
+    monkeypatch.setattr(app, "current_hour", lambda: hour["now"])
+    return hour
+
+
+def ranking(board, window, segment="all"):
+    return [
+        (row["product_id"], row["units_sold"]) for row in board.top(window, segment)
+    ]
+
+
+def test_ranking_per_window_and_segment(clock):
+    board = SalesLeaderboard(
+        PRODUCTS,
+        [
+            (NOW, 1, 3),
+            (NOW - 2, 2, 5),
+            (NOW - 48, 1, 4),  # outside 24h, inside 7d
+            (NOW - 24 * 20, 3, 9),  # 30d only
+            (NOW - 24 * 31, 2, 100),  # outside every window
+        ],
+        1,
+    )
+    assert ranking(board, "24h") == [(2, 5), (1, 3)]
+    assert ranking(board, "7d") == [(1, 7), (2, 5)]
+    assert ranking(board, "30d") == [(3, 9), (1, 7), (2, 5)]
+    assert ranking(board, "7d", "genre:RPG") == [(1, 7)]
+    assert board.segments("24h") == ["all", "genre:RPG", "type:game"]
+
+
+def test_buckets_slide_out_as_time_passes(clock):
+    board = SalesLeaderboard(PRODUCTS, [(NOW, 1, 3), (NOW - 20, 2, 5)], 1)
+    assert ranking(board, "24h") == [(2, 5), (1, 3)]
+
+    clock["now"] = NOW + 4
+    assert ranking(board, "24h") == [(1, 3)]
+    assert ranking(board, "7d") == [(2, 5), (1, 3)]
+
+
+def test_apply_changes_sets_absolute_bucket_units(clock):
+    board = SalesLeaderboard(PRODUCTS, [(NOW, 1, 3), (NOW - 1, 2, 5)], 1)
+    ranking(board, "24h")  # fill the cache
+
+    board.apply_changes([(NOW, 1, 8), (NOW - 1, 2, 0), (NOW, 3, 1)], 4)
+
+    assert board.version == 4
+    assert ranking(board, "24h") == [(1, 8), (3, 1)]
+    assert ranking(board, "24h", "type:game") == [(1, 8)]
+
+
+def test_limit_and_unknown_products(clock):
+    board = SalesLeaderboard(PRODUCTS, [(NOW, 1, 1), (NOW, 2, 2), (NOW, 99, 1)], 1)
+    # Product 99 is no longer in the catalog and is never returned
+    assert ranking(board, "24h") == [(2, 2), (1, 1)]
+    assert [row["product_id"] for row in board.top("24h", limit=1)] == [2]
@@ -0,0 +1,73 @@
+"""Tests for the vectorized branch rebalancing planner (app.plan_rebalancing)"""
+
+import numpy as np
+
+from app import plan_rebalancing
+
+
+def apply_plan(product_ids, branch_ids, quantity, moves):
+    """Stock per (product_id, branch_id) after executing the planned moves"""
+    stock = {
+        (product, branch): amount
+        for product, branch, amount in zip(product_ids, branch_ids, quantity)
+    }
+    for product, source, target, amount in moves:
+        stock[(product, source)] -= amount
+        stock[(product, target)] += amount
+    return stock
+
+
+def test_excess_goes_to_deficit():
+    moves = plan_rebalancing([1, 1], [10, 20], [30, 0], [5, 5], [20, 20])
+    stock = apply_plan([1, 1], [10, 20], [30, 0], moves)
+    assert stock == {(1, 10): 20, (1, 20): 10}
+    assert all(source != target and amount > 0 for _, source, target, amount in moves)
+
+
+def test_balanced_inventory_needs_no_moves():
+    assert plan_rebalancing([1, 1], [10, 20], [10, 10], [5, 5], [20, 20]) == []
+    assert plan_rebalancing([], [], [], [], []) == []
+
+
+def test_excess_without_room_moves_only_what_fits():
+    # 50 units, but the two branches only hold 40 together
+    moves = plan_rebalancing([1, 1], [10, 20], [50, 0], [5, 5], [20, 20])
+    assert moves == [(1, 10, 20, 20)]
+
+
+def test_moves_stay_within_a_product():
+    product_ids = [1, 1, 2, 2]
+    branch_ids = [10, 20, 10, 20]
+    moves = plan_rebalancing(product_ids, branch_ids, [30, 0, 0, 30], [5] * 4, [20] * 4)
+    assert sorted(
+        (product, source, target) for product, source, target, _ in moves
+    ) == [
+        (1, 10, 20),
+        (2, 20, 10),
+    ]
+
+
+def test_random_plans_conserve_stock_and_never_go_negative():
+    rng = np.random.default_rng(7)
+    for _ in range(200):
+        rows = int(rng.integers(1, 30))
+        product_ids = rng.integers(1, 5, rows)
+        branch_ids = np.arange(rows)
+        quantity = rng.integers(0, 60, rows)
+        maximum = rng.integers(0, 50, rows)
+        minimum = rng.integers(0, 30, rows)
+
+        moves = plan_rebalancing(product_ids, branch_ids, quantity, minimum, maximum)
+        stock = apply_plan(product_ids.tolist(), branch_ids.tolist(), quantity, moves)
+
+        assert all(amount >= 0 for amount in stock.values())
+        for product in set(product_ids.tolist()):
+            before = quantity[product_ids == product].sum()
+            after = sum(v for (p, _), v in stock.items() if p == product)
+            assert before == after
+        # A source never sends more than it holds
+        sent = {}
+        for product, source, _, amount in moves:
+            sent[(product, source)] = sent.get((product, source), 0) + amount
+        for (product, source), amount in sent.items():
+            assert amount <= quantity[source]
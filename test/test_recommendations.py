@@ -0,0 +1,64 @@
+"""Tests for the co-purchase counting in database/build_recommendations.py"""
+
+import numpy as np
+
+from build_recommendations import count_pairs, top_k_neighbours
+
+# order 1: 10, 20 / order 2: 10, 20, 30 / order 3: 10 (lines unsorted on purpose)
+ORDER_IDS = np.array([2, 1, 3, 2, 1, 2])
+PRODUCT_IDS = np.array([30, 20, 10, 10, 10, 20])
+ORDER_COUNTS = {10: 3, 20: 2, 30: 1}
+
+
+def pair_dict(product_a, product_b, pair_counts):
+    return {
+        (int(a), int(b)): int(count)
+        for a, b, count in zip(product_a, product_b, pair_counts)
+    }
+
+
+def test_count_pairs_counts_each_ordered_pair_once_per_order():
+    pairs = pair_dict(*count_pairs(ORDER_IDS, PRODUCT_IDS))
+    assert pairs == {
+        (10, 20): 2,
+        (20, 10): 2,
+        (10, 30): 1,
+        (30, 10): 1,
+        (20, 30): 1,
+        (30, 20): 1,
+    }
+
+
+def test_count_pairs_without_lines():
+    product_a, product_b, pair_counts = count_pairs(
+        np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    )
+    assert len(product_a) == len(product_b) == len(pair_counts) == 0
+
+
+def test_top_k_neighbours_ranks_by_cosine_similarity():
+    product_a, rank_no, product_b, pair_counts, scores = top_k_neighbours(
+        *count_pairs(ORDER_IDS, PRODUCT_IDS), ORDER_COUNTS
+    )
+    ranked = {}
+    for a, rank, b, score in zip(product_a, rank_no, product_b, scores):
+        ranked.setdefault(int(a), []).append(
+            (int(rank), int(b), round(float(score), 3))
+        )
+
+    assert ranked == {
+        10: [(1, 20, 0.816), (2, 30, 0.577)],
+        20: [(1, 10, 0.816), (2, 30, 0.707)],
+        30: [(1, 20, 0.707), (2, 10, 0.577)],
+    }
+
+
+def test_top_k_neighbours_keeps_k_per_product():
+    product_a, rank_no, product_b, _, _ = top_k_neighbours(
+        *count_pairs(ORDER_IDS, PRODUCT_IDS), ORDER_COUNTS, k=1
+    )
+    assert list(zip(product_a, rank_no, product_b)) == [
+        (10, 1, 20),
+        (20, 1, 10),
+        (30, 1, 20),
+    ]
@@ -0,0 +1,80 @@
+"""Tests for the in-memory typeahead and fuzzy search indexes"""
+
+from app import SuggestIndex, TrigramIndex, normalize_search_text, trigrams
+
+ENTRIES = [
+    ("the witcher 3", "The Witcher 3", "product", 1, 50),
+    ("witcher 3", "The Witcher 3", "product", 1, 50),
+    ("witcher 2", "The Witcher 2", "product", 2, 10),
+    ("wipeout", "Wipeout", "product", 3, 80),
+    ("cd projekt red", "CD Projekt Red", "developer", None, 60),
+    ("zelda", "Zelda", "product", 4, 5),
+]
+
+
+def test_normalize_search_text():
+    assert normalize_search_text("  The Witcher-3: Wild  Hunt! ") == (
+        "the witcher 3 wild hunt"
+    )
+    assert normalize_search_text(None) == ""
+
+
+def test_suggest_ranks_prefix_matches_by_popularity():
+    index = SuggestIndex(ENTRIES)
+    assert [s["text"] for s in index.suggest("wi")] == [
+        "Wipeout",
+        "The Witcher 3",
+        "The Witcher 2",
+    ]
+
+
+def test_suggest_long_prefix_uses_the_sorted_keys():
+    # Longer than SUGGEST_PRECOMPUTED_PREFIX, so answered by bisect
+    index = SuggestIndex(ENTRIES)
+    suggestions = index.suggest("WITCHER ", limit=5)
+    assert [s["product_id"] for s in suggestions] == [1, 2]
+    assert suggestions[0] == {
+        "text": "The Witcher 3",
+        "type": "product",
+        "product_id": 1,
+        "popularity": 50,
+    }
+
+
+def test_suggest_keeps_one_entry_per_label_and_respects_limit():
+    index = SuggestIndex(ENTRIES)
+    assert [s["text"] for s in index.suggest("w", limit=2)] == [
+        "Wipeout",
+        "The Witcher 3",
+    ]
+    assert index.suggest("xyz") == []
+    assert index.suggest("  ") == []
+
+
+def test_trigrams_are_padded_per_word():
+    assert trigrams("Cat") == {"  c", " ca", "cat", "at "}
+    assert trigrams("") == set()
+
+
+PRODUCTS = [
+    (1, "The Witcher 3: Wild Hunt"),
+    (2, "Witcher 2"),
+    (3, "Wipeout Omega"),
+    (4, "Stardew Valley"),
+]
+
+
+def test_trigram_search_tolerates_typos():
+    index = TrigramIndex(PRODUCTS)
+    results = index.search("wticher")
+    assert [product_id for product_id, _ in results][:2] == [2, 1]
+    assert 4 not in dict(results)
+
+
+def test_trigram_search_scores_and_threshold():
+    index = TrigramIndex(PRODUCTS)
+    exact = dict(index.search("stardew valley"))
+    assert exact == {4: 1.0}
+    assert index.search("stardew valley", threshold=1.1) == []
+    assert index.search("!!!") == []
+    assert len(index.search("witcher", threshold=0.1, limit=1)) == 1
@@ -0,0 +1,43 @@
+"""Tests for the sparse content-based similarity in build_similar_games.py"""
+
+import numpy as np
+
+from build_similar_games import build_feature_matrix, top_k_similar
+
+FEATURES = {
+    1: [("genre", 1), ("developer", "CD Projekt"), ("platform", "PC")],
+    2: [("genre", 1), ("developer", "CD Projekt"), ("platform", "PS5")],
+    3: [("genre", 2), ("platform", "PC")],
+    4: [("genre", 2), ("esrb", "M")],
+    5: [("publisher", "Solo")],
+}
+
+
+def test_feature_matrix_is_sparse_and_normalised():
+    product_ids = sorted(FEATURES)
+    indptr, indices, data, n_columns = build_feature_matrix(product_ids, FEATURES)
+
+    # Features held by a single game (PS5, M, Solo) are dropped
+    assert n_columns == 4
+    assert list(np.diff(indptr)) == [3, 2, 2, 1, 0]
+    for row in range(4):
+        values = data[indptr[row] : indptr[row + 1]]
+        assert np.isclose(np.sum(values**2), 1.0)
+        assert list(indices[indptr[row] : indptr[row + 1]]) == sorted(
+            indices[indptr[row] : indptr[row + 1]]
+        )
+
+
+def test_top_k_similar_ranks_shared_features_first():
+    product_ids = sorted(FEATURES)
+    matrix = build_feature_matrix(product_ids, FEATURES)
+    neighbours = {
+        product_ids[row]: [product_ids[n] for n in rows]
+        for row, rows, _ in top_k_similar(matrix, k=3)
+    }
+
+    assert neighbours[1][:2] == [2, 3]
+    assert neighbours[2] == [1]
+    assert neighbours[4] == [3]
+    # A game without shared features has no neighbours
+    assert neighbours[5] == []